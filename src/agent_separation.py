@@ -0,0 +1,82 @@
+import numpy as np
+
+from src.point_grid import PointGrid
+
+
+class AgentSeparation:
+    """
+    Resolves overlaps between agents. Every agent body is approximated by a bounding circle. Candidate pairs come from a
+    uniform grid broad phase, the narrow phase computes the overlaps and push vectors for all pairs at once with numpy.
+    """
+
+    def __init__(self, radius: float = 6, strength: float = 1.0):
+        """
+        :param radius: Radius of the bounding circle of an agent.
+        :param strength: Fraction of an overlap that is resolved per step. 1 fully separates a pair in one step.
+        """
+        self.radius = radius
+        self.strength = strength
+        self.num_overlaps = 0  # Number of overlapping pairs found in the last step
+
+    def resolve(self, simulation):
+        """
+        Push all overlapping agents of the simulation apart. Agents are not pushed out of the simulation area or into
+        obstacles.
+        :param simulation: Simulation instance.
+        """
+        agents = simulation.agents
+        num_agents = len(agents)
+        if num_agents < 2:
+            self.num_overlaps = 0
+            return
+
+        xs = np.fromiter((agent.x for agent in agents), dtype=np.float64, count=num_agents)
+        ys = np.fromiter((agent.y for agent in agents), dtype=np.float64, count=num_agents)
+
+        # Broad phase: cell size = diameter, so overlapping agents are always in the same or in neighbouring cells
+        diameter = 2 * self.radius
+        i, j = PointGrid(xs, ys, cell_size=diameter).candidate_pairs()
+
+        # Narrow phase: keep pairs with overlapping circles
+        delta_x = xs[j] - xs[i]
+        delta_y = ys[j] - ys[i]
+        distance = np.hypot(delta_x, delta_y)
+        overlapping = distance < diameter
+        i, j = i[overlapping], j[overlapping]
+        delta_x, delta_y, distance = delta_x[overlapping], delta_y[overlapping], distance[overlapping]
+        self.num_overlaps = len(i)
+        if self.num_overlaps == 0:
+            return
+
+        # Agents on the exact same spot are pushed apart along the x-axis
+        same_spot = distance == 0
+        delta_x[same_spot] = 1
+        distance[same_spot] = 1
+
+        # Each agent of a pair is moved by half of the overlap along the line between them
+        push = (diameter - distance) / distance * (self.strength / 2)
+        push_x = delta_x * push
+        push_y = delta_y * push
+        displacement_x = np.zeros(num_agents)
+        displacement_y = np.zeros(num_agents)
+        np.add.at(displacement_x, i, -push_x)
+        np.add.at(displacement_y, i, -push_y)
+        np.add.at(displacement_x, j, push_x)
+        np.add.at(displacement_y, j, push_y)
+
+        # Agent locations are integer coordinates within the simulation area
+        new_xs = np.clip(np.round(xs + displacement_x), 0, simulation.size[0] - 1).astype(np.int64)
+        new_ys = np.clip(np.round(ys + displacement_y), 0, simulation.size[1] - 1).astype(np.int64)
+
+        obstacle_index = simulation.world.obstacle_index
+        obstacle_rects = obstacle_index.rects
+        for agent_index in np.nonzero((new_xs != xs) | (new_ys != ys))[0].tolist():
+            new_x = int(new_xs[agent_index])
+            new_y = int(new_ys[agent_index])
+
+            # Skip pushes into obstacles, the overlap is resolved from the other agent or in a later step
+            if any(obstacle_rects[obstacle_id].collidepoint(new_x, new_y)
+                   for obstacle_id in obstacle_index.query_point(new_x, new_y)):
+                continue
+
+            agents[agent_index].move((new_x, new_y))
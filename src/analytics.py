@@ -0,0 +1,135 @@
+import math
+import numpy as np
+from typing import Tuple
+
+
+class SimulationAnalytics:
+    """
+    Aggregated statistics of a running simulation, updated incrementally every step. Memory is bounded by the world
+    grid, the number of agents and obstacles and the number of histogram bins, not by the length of the run:
+    - Occupancy heatmap: number of agent visits per world grid cell.
+    - Collision counts per obstacle and per agent.
+    - Histogram of sensor hit distances.
+    - Distance travelled per agent.
+    """
+
+    def __init__(self, world_size: Tuple[int, int], cell_size: int = 32, sensor_histogram_bins: int = 50,
+                 max_sensor_distance: float = 500):
+        """
+        :param world_size: Size of the simulation area.
+        :param cell_size: Width and height of one heatmap cell in world units.
+        :param sensor_histogram_bins: Number of bins of the sensor hit distance histogram.
+        :param max_sensor_distance: Upper end of the histogram range. Longer hit distances are counted in the last bin.
+        """
+        self.world_size = world_size
+        self.cell_size = cell_size
+        self.ticks = 0
+
+        # Occupancy heatmap, indexed [cell x, cell y]
+        self.heatmap_shape = (math.ceil(world_size[0] / cell_size), math.ceil(world_size[1] / cell_size))
+        self.heatmap = np.zeros(self.heatmap_shape, dtype=np.int64)
+
+        # Per agent statistics, indexed like the agent list of the simulation
+        self.agent_ids = np.zeros(0, dtype=np.int64)
+        self.agent_collisions = np.zeros(0, dtype=np.int64)
+        self.distance_travelled = np.zeros(0, dtype=np.float64)
+        self.last_xs = np.zeros(0, dtype=np.float64)
+        self.last_ys = np.zeros(0, dtype=np.float64)
+
+        # Collision counts indexed by obstacle id. Grows with the largest id seen.
+        self.obstacle_collisions = np.zeros(0, dtype=np.int64)
+
+        # Sensor hit distances
+        self.sensor_bin_edges = np.linspace(0, max_sensor_distance, sensor_histogram_bins + 1)
+        self.sensor_histogram = np.zeros(sensor_histogram_bins, dtype=np.int64)
+        self.sensor_hits = 0
+        self.sensor_rays = 0
+
+    def update(self, simulation, collided_agents=(), collided_obstacles=()):
+        """
+        Add the state of the current simulation step to the aggregates.
+        :param simulation: Simulation instance.
+        :param collided_agents: Indices (in the agent list) of agents that collided with an obstacle this step. One
+                                entry per collision.
+        :param collided_obstacles: Ids of the obstacles of these collisions, in the same order.
+        """
+        agents = simulation.agents
+        num_agents = len(agents)
+        self.ticks += 1
+
+        xs, ys = simulation._get_agent_positions()
+        self._add_agents(agents, xs, ys)
+
+        # Distance travelled since the last step, including pushes out of obstacles and away from other agents
+        self.distance_travelled += np.hypot(xs - self.last_xs, ys - self.last_ys)
+        self.last_xs = xs
+        self.last_ys = ys
+
+        # Visit heatmap, one count per agent and step
+        cell_xs = np.clip((xs // self.cell_size).astype(np.int64), 0, self.heatmap_shape[0] - 1)
+        cell_ys = np.clip((ys // self.cell_size).astype(np.int64), 0, self.heatmap_shape[1] - 1)
+        self.heatmap += np.bincount(cell_xs * self.heatmap_shape[1] + cell_ys,
+                                    minlength=self.heatmap.size).reshape(self.heatmap_shape)
+
+        # Obstacle collisions per agent and per obstacle
+        if len(collided_agents):
+            self.agent_collisions += np.bincount(np.asarray(collided_agents, dtype=np.int64), minlength=num_agents)
+            obstacle_counts = np.bincount(np.asarray(collided_obstacles, dtype=np.int64))
+            if len(obstacle_counts) > len(self.obstacle_collisions):
+                self.obstacle_collisions = np.concatenate(
+                    (self.obstacle_collisions,
+                     np.zeros(len(obstacle_counts) - len(self.obstacle_collisions), dtype=np.int64)))
+            self.obstacle_collisions[:len(obstacle_counts)] += obstacle_counts
+
+        # Sensor hit distances. Sensors are only evaluated while they are shown or needed by a policy.
+        if simulation.show_agent_sensors or simulation.compute_sensors:
+            distances = np.concatenate([np.frombuffer(agent.vision_sensor.collision_distance, dtype=np.float64)
+                                        for agent in agents]) if agents else np.zeros(0)
+            hit_distances = distances[~np.isnan(distances)]
+            self.sensor_rays += len(distances)
+            self.sensor_hits += len(hit_distances)
+            hit_distances = np.minimum(hit_distances, self.sensor_bin_edges[-1])
+            self.sensor_histogram += np.histogram(hit_distances, bins=self.sensor_bin_edges)[0]
+
+    def _add_agents(self, agents, xs, ys):
+        """
+        Extend the per agent statistics for agents that were added since the last step. New agents start at their
+        current location.
+        """
+        num_known_agents = len(self.agent_ids)
+        if len(agents) == num_known_agents:
+            return
+
+        num_new_agents = len(agents) - num_known_agents
+        self.agent_ids = np.concatenate((self.agent_ids, np.fromiter(
+            (agent.agent_id for agent in agents[num_known_agents:]), dtype=np.int64, count=num_new_agents)))
+        self.agent_collisions = np.concatenate((self.agent_collisions, np.zeros(num_new_agents, dtype=np.int64)))
+        self.distance_travelled = np.concatenate((self.distance_travelled, np.zeros(num_new_agents)))
+        self.last_xs = np.concatenate((self.last_xs, xs[num_known_agents:]))
+        self.last_ys = np.concatenate((self.last_ys, ys[num_known_agents:]))
+
+    def snapshot(self) -> dict:
+        """
+        :return: Copy of all aggregates. Obstacles are only listed if they had at least one collision.
+        """
+        obstacle_ids = np.nonzero(self.obstacle_collisions)[0]
+        return {"ticks": self.ticks,
+                "cell_size": self.cell_size,
+                "heatmap": self.heatmap.copy(),
+                "agent_ids": self.agent_ids.copy(),
+                "agent_collisions": self.agent_collisions.copy(),
+                "distance_travelled": self.distance_travelled.copy(),
+                "obstacle_ids": obstacle_ids,
+                "obstacle_collisions": self.obstacle_collisions[obstacle_ids],
+                "total_collisions": int(self.agent_collisions.sum()),
+                "sensor_bin_edges": self.sensor_bin_edges.copy(),
+                "sensor_histogram": self.sensor_histogram.copy(),
+                "sensor_hits": self.sensor_hits,
+                "sensor_rays": self.sensor_rays}
+
+    def dump(self, path: str):
+        """
+        Save a snapshot as compressed numpy archive. It can be loaded with numpy.load.
+        :param path: File path, ".npz" is appended by numpy if missing.
+        """
+        np.savez_compressed(path, **self.snapshot())
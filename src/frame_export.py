@@ -0,0 +1,151 @@
+import multiprocessing
+import os
+import queue
+import struct
+import zlib
+from typing import Tuple
+
+
+def encode_png(width: int, height: int, rgb_bytes: bytes, compression_level: int = 6) -> bytes:
+    """
+    Encode raw RGB pixels as PNG file. Uses only zlib, so the encoding workers never load pygame.
+    :param width: Image width in pixels.
+    :param height: Image height in pixels.
+    :param rgb_bytes: Pixels as rows of 8 bit RGB values, top row first.
+    :param compression_level: zlib compression level from 0 (none) to 9 (smallest).
+    :return: Content of the PNG file.
+    """
+    def chunk(chunk_type, data):
+        return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+    # Every row starts with the filter type byte (0 = no filter)
+    stride = width * 3
+    raw_rows = b"".join(b"\x00" + rgb_bytes[row * stride:(row + 1) * stride] for row in range(height))
+
+    return (b"\x89PNG\r\n\x1a\n" +
+            chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) +
+            chunk(b"IDAT", zlib.compress(raw_rows, compression_level)) +
+            chunk(b"IEND", b""))
+
+
+def _png_worker(frame_queue, output_dir: str, frame_size: Tuple[int, int], compression_level: int):
+    """
+    Encoding process for numbered PNG frames. Runs until it receives None.
+    """
+    while True:
+        frame = frame_queue.get()
+        if frame is None:
+            return
+
+        frame_number, rgb_bytes = frame
+        path = os.path.join(output_dir, f"frame_{frame_number:06d}.png")
+
+        # Write to a temporary file first, so readers never see half written frames
+        with open(path + ".tmp", "wb") as file:
+            file.write(encode_png(frame_size[0], frame_size[1], rgb_bytes, compression_level))
+        os.replace(path + ".tmp", path)
+
+
+def _video_worker(frame_queue, output_path: str):
+    """
+    Writing process for a raw video stream. Frames are appended in the order they arrive. Runs until it receives None.
+    """
+    with open(output_path, "wb") as file:
+        while True:
+            frame = frame_queue.get()
+            if frame is None:
+                return
+            file.write(frame[1])
+
+
+class FrameExporter:
+    """
+    Writes rendered frames in background processes, so encoding and disk writes do not slow down the simulation.
+    Frames are copied from the surface and passed through a bounded queue to the workers. There are two output
+    formats:
+    - Numbered PNG frames in a directory, encoded by several worker processes in parallel.
+    - One raw video stream (8 bit RGB, no header) written by a single worker, e.g. for
+      ffmpeg -f rawvideo -pix_fmt rgb24 -s <width>x<height> -r <fps> -i <file> video.mp4
+    """
+
+    def __init__(self, output: str, frame_size: Tuple[int, int], raw_video: bool = False, num_workers: int = 2,
+                 queue_size: int = 16, compression_level: int = 6, drop_frames: bool = False):
+        """
+        :param output: Directory for PNG frames or file path of the raw video stream.
+        :param frame_size: Size of the exported frames. All submitted surfaces must have this size.
+        :param raw_video: Write a raw video stream instead of PNG frames.
+        :param num_workers: Number of PNG encoding processes. A raw video stream always uses a single writer, so the
+                            frames stay in order.
+        :param queue_size: Maximum number of frames waiting for a worker.
+        :param compression_level: zlib compression level of the PNG frames from 0 (none) to 9 (smallest).
+        :param drop_frames: If the queue is full, drop the frame instead of waiting for a free slot.
+        """
+        self.output = output
+        self.frame_size = frame_size
+        self.raw_video = raw_video
+        self.drop_frames = drop_frames
+
+        self.frames_submitted = 0
+        self.frames_dropped = 0
+
+        self.frame_queue = multiprocessing.Queue(maxsize=queue_size)
+        if raw_video:
+            self.workers = [multiprocessing.Process(target=_video_worker, args=(self.frame_queue, output),
+                                                    daemon=True)]
+        else:
+            os.makedirs(output, exist_ok=True)
+            self.workers = [multiprocessing.Process(target=_png_worker,
+                                                    args=(self.frame_queue, output, frame_size, compression_level),
+                                                    daemon=True)
+                            for _ in range(num_workers)]
+
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, surface) -> bool:
+        """
+        Queue the current content of a surface for export. Only the pixel copy happens in the calling process.
+        :param surface: pygame surface of the export frame size.
+        :return: False if the frame was dropped because the queue was full.
+        """
+        import pygame
+
+        if surface.get_size() != tuple(self.frame_size):
+            raise ValueError(f"Surface size {surface.get_size()} does not match the frame size {self.frame_size}")
+
+        frame = (self.frames_submitted, pygame.image.tobytes(surface, "RGB"))
+
+        if self.drop_frames:
+            try:
+                self.frame_queue.put_nowait(frame)
+            except queue.Full:
+                self.frames_dropped += 1
+                return False
+        else:
+            # Wait for a free slot, but do not wait forever on workers that died
+            while True:
+                try:
+                    self.frame_queue.put(frame, timeout=1)
+                    break
+                except queue.Full:
+                    if not all(worker.is_alive() for worker in self.workers):
+                        raise RuntimeError("A frame export worker stopped unexpectedly")
+
+        self.frames_submitted += 1
+        return True
+
+    def close(self):
+        """
+        Wait until all queued frames are written and stop the workers.
+        """
+        for worker in self.workers:
+            if worker.is_alive():
+                self.frame_queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,130 @@
+class FrameBudgetGovernor:
+    """
+    Keeps the work per frame within a time budget by reducing the sensor fidelity of background agents. Foreground
+    agents (on screen, selected or player controlled) always get full sensor updates. Background agents are split into
+    groups that take turns: every tick one group is updated, the others keep their last sensor results. At higher
+    degradation levels the updated background agents additionally only cast every n-th ray.
+    The fidelity is only reduced if the sensors are the problem: if the other phases alone exceed the budget, reducing
+    the sensors cannot meet it and the governor only reports that the budget is unreachable.
+    """
+
+    # (sensor update interval, ray step) for background agents per degradation level
+    levels = ((1, 1), (2, 1), (4, 1), (4, 2), (8, 2), (8, 4), (16, 4))
+
+    def __init__(self, frame_budget: float, smoothing: float = 0.2, degrade_cooldown: int = 10,
+                 recover_cooldown: int = 30, recover_threshold: float = 0.7, min_sensor_share: float = 0.25):
+        """
+        :param frame_budget: Target time for the simulation work of one frame in seconds.
+        :param smoothing: Weight of the newest frame in the moving average of the frame cost.
+        :param degrade_cooldown: Frames to wait after a level change before degrading further.
+        :param recover_cooldown: Frames to wait after a level change before increasing the fidelity again.
+        :param recover_threshold: Fidelity is increased when the frame cost drops below this fraction of the budget.
+        :param min_sensor_share: Fidelity is only reduced if the sensor cost is at least this fraction of the time the
+                                 frames are over budget.
+        """
+        self.frame_budget = frame_budget
+        self.smoothing = smoothing
+        self.degrade_cooldown = degrade_cooldown
+        self.recover_cooldown = recover_cooldown
+        self.recover_threshold = recover_threshold
+        self.min_sensor_share = min_sensor_share
+
+        self.level = 0
+        self.tick = 0
+        self.frames_since_level_change = 0
+
+        # Costs of the phases of the last frame and their moving averages
+        self.phase_costs = {}
+        self.average_phase_costs = {}
+        self.average_frame_cost = 0
+
+        # False while the phases other than the sensors alone take longer than the budget
+        self.budget_reachable = True
+
+        # Statistics
+        self.over_budget_frames = 0
+        self.full_sensor_updates = 0
+        self.reduced_sensor_updates = 0
+        self.skipped_sensor_updates = 0
+
+    def record_phase(self, phase: str, cost: float):
+        """
+        Store the cost of one phase of the current frame.
+        :param phase: Name of the phase, e.g. "sensors" or "draw".
+        :param cost: Time the phase took in seconds.
+        """
+        self.phase_costs[phase] = cost
+
+    def start_tick(self):
+        """
+        Evaluate the phase costs of the last frame and adapt the degradation level. Called once at the start of every
+        simulation step.
+        """
+        if self.phase_costs:
+            frame_cost = sum(self.phase_costs.values())
+            self.average_frame_cost += self.smoothing * (frame_cost - self.average_frame_cost)
+            for phase, cost in self.phase_costs.items():
+                average_cost = self.average_phase_costs.get(phase, cost)
+                self.average_phase_costs[phase] = average_cost + self.smoothing * (cost - average_cost)
+
+            if frame_cost > self.frame_budget:
+                self.over_budget_frames += 1
+
+            # Reducing the sensor fidelity only helps if the sensors are a relevant part of the overrun
+            sensor_cost = self.average_phase_costs.get("sensors", 0)
+            overrun = self.average_frame_cost - self.frame_budget
+            self.budget_reachable = self.average_frame_cost - sensor_cost <= self.frame_budget
+            sensors_relevant = self.budget_reachable and sensor_cost >= self.min_sensor_share * overrun
+
+            self.frames_since_level_change += 1
+            if (overrun > 0 and sensors_relevant and self.level < len(self.levels) - 1 and
+                    self.frames_since_level_change >= self.degrade_cooldown):
+                self.level += 1
+                self.frames_since_level_change = 0
+            elif (self.average_frame_cost < self.recover_threshold * self.frame_budget and self.level > 0 and
+                  self.frames_since_level_change >= self.recover_cooldown):
+                self.level -= 1
+                self.frames_since_level_change = 0
+
+        self.phase_costs = {}
+        self.tick += 1
+
+    def sensor_update(self, agent_index: int, foreground: bool):
+        """
+        Decide how the sensors of an agent are updated in the current tick.
+        :param agent_index: Index of the agent in the simulation. Used to rotate which agents are updated.
+        :param foreground: Agent needs full fidelity, e.g. because it is visible.
+        :return: Ray step for the sensor update or 0 if the sensor update is skipped this tick.
+        """
+        if foreground or self.level == 0:
+            self.full_sensor_updates += 1
+            return 1
+
+        interval, ray_step = self.levels[self.level]
+        if (agent_index + self.tick) % interval != 0:
+            self.skipped_sensor_updates += 1
+            return 0
+
+        if ray_step == 1:
+            self.full_sensor_updates += 1
+        else:
+            self.reduced_sensor_updates += 1
+        return ray_step
+
+    def stats(self) -> dict:
+        """
+        :return: Current degradation level and settings, frame costs and counters of full, reduced and skipped sensor
+                 updates since the start.
+        """
+        interval, ray_step = self.levels[self.level]
+        return {"level": self.level,
+                "background_sensor_interval": interval,
+                "background_ray_step": ray_step,
+                "frame_budget": self.frame_budget,
+                "average_frame_cost": self.average_frame_cost,
+                "average_phase_costs": dict(self.average_phase_costs),
+                "budget_reachable": self.budget_reachable,
+                "over_budget_frames": self.over_budget_frames,
+                "full_sensor_updates": self.full_sensor_updates,
+                "reduced_sensor_updates": self.reduced_sensor_updates,
+                "skipped_sensor_updates": self.skipped_sensor_updates}
@@ -28,7 +28,11 @@ class AgentCameraSurface(pygame.Surface):
         self.vision_line_length_per_distance_unit = self.max_vision_line_length / self.max_collision_distance
         self.color_step_size = 200 / self.max_collision_distance
 
-    def display(self):
+    def display(self, agents):
+        """
+        Draw the view of the agent.
+        :param agents: All agents of the simulation. Agents in the field of view are drawn.
+        """
 
         # Reset view. Set sky and floor color.
         self.fill(black)
@@ -43,7 +47,7 @@ class AgentCameraSurface(pygame.Surface):
 
         # Draw a vision line for every vision ray collision
         for i, collision_distance in enumerate(collision_distances):
-            if collision_distance is not None:
+            if not math.isnan(collision_distance):
 
                 # Calculate the angle of the current ray relative to the player's direction
                 current_angle = self.agent.rotation - half_fov + (i * delta_angle)
@@ -68,7 +72,7 @@ class AgentCameraSurface(pygame.Surface):
 
         """DRAW OTHER AGENTS"""
 
-        near_agents = self.agent.agent_vicinity_detection(self.max_collision_distance)
+        near_agents = self.agent.agent_vicinity_detection(agents, self.max_collision_distance)
         pixel_per_fov = self.size[0] / self.agent.vision_sensor.fov
         agent_max_size = 30
         delta_size_per_distance_unit = agent_max_size / self.max_collision_distance
@@ -86,8 +90,8 @@ class AgentCameraSurface(pygame.Surface):
                 agent_pos_to_collision_index = min(round((agent_angle + half_fov) * rays_per_fov),
                                                    self.agent.vision_sensor.num_of_rays - 1)
 
-                if (collision_distances[agent_pos_to_collision_index] is None or
-                        collision_distances[agent_pos_to_collision_index] >= agent_distance):
+                # NaN (no collision on this ray) compares False, so the agent is visible in that case
+                if not collision_distances[agent_pos_to_collision_index] < agent_distance:
 
                     agent_display_location = (pixel_per_fov * (agent_angle + half_fov), self.y_middle)
                     agent_display_size = agent_max_size + 1 - agent_distance*delta_size_per_distance_unit
@@ -0,0 +1,144 @@
+import math
+import pygame
+from typing import Tuple
+
+from src.colors import *
+from src import utils
+
+
+class AgentSpriteAtlas:
+    """
+    Pre-rasterized agent shapes for every full degree of rotation. Rotations are rendered once per color on first use
+    and then only blitted.
+    """
+
+    def __init__(self, polygon, rotation_steps: int = 360):
+        """
+        :param polygon: Agent shape as list of points relative to the agent location.
+        :param rotation_steps: Number of pre-rendered rotations over a full turn.
+        """
+        self.polygon = polygon
+        self.rotation_steps = rotation_steps
+        self.sprites = {}  # color -> list of (surface, x offset, y offset) per rotation step
+
+    def get_sprites(self, color: Tuple[int, int, int]):
+        """
+        :param color: Fill color of the agent shape.
+        :return: List of (surface, x offset, y offset) for every rotation step. The offset is the position of the
+                 surface relative to the agent location.
+        """
+        sprites = self.sprites.get(color)
+        if sprites is None:
+            sprites = [self._render_rotation(color, step * 360 / self.rotation_steps)
+                       for step in range(self.rotation_steps)]
+            self.sprites[color] = sprites
+        return sprites
+
+    def _render_rotation(self, color, angle):
+        rotated_polygon = utils.rotate_polygon(self.polygon, angle)
+        min_x = math.floor(min(point[0] for point in rotated_polygon))
+        min_y = math.floor(min(point[1] for point in rotated_polygon))
+        max_x = math.ceil(max(point[0] for point in rotated_polygon))
+        max_y = math.ceil(max(point[1] for point in rotated_polygon))
+
+        surface = pygame.Surface((max_x - min_x + 1, max_y - min_y + 1), pygame.SRCALPHA)
+        pygame.draw.polygon(surface, color, [(x - min_x, y - min_y) for x, y in rotated_polygon])
+
+        return surface, min_x, min_y
+
+
+class AgentRenderer:
+    """
+    Draws all agents, their sensors and debug markers with as few pygame calls as possible. Agents and markers are
+    blitted from pre-rendered surfaces in one Surface.blits call, sensor rays are drawn with one line call per agent.
+    """
+
+    def __init__(self, polygon, marker_radius: int = 2):
+        """
+        :param polygon: Agent shape as list of points relative to the agent location.
+        :param marker_radius: Radius of the debug markers (agent locations and sensor collisions).
+        """
+        self.atlas = AgentSpriteAtlas(polygon)
+
+        # Debug marker, same look as pygame.draw.circle(screen, red, location, 2, 2)
+        self.marker_radius = marker_radius
+        self.marker_surface = pygame.Surface((2 * marker_radius + 1, 2 * marker_radius + 1), pygame.SRCALPHA)
+        pygame.draw.circle(self.marker_surface, red, (marker_radius, marker_radius), marker_radius, marker_radius)
+
+    def draw_agents(self, screen, agents, selected_agent=None, offset: Tuple[float, float] = (0, 0),
+                    scale: float = 1.0):
+        """
+        Draw the shapes of all agents in one batched blit. The shapes keep their size at every scale.
+        :param screen: Surface to draw on.
+        :param agents: Agents to draw.
+        :param selected_agent: Agent that gets drawn in the selection color.
+        :param offset: Screen position of the world origin.
+        :param scale: Screen pixels per world unit.
+        """
+        offset_x, offset_y = offset
+        rotation_steps = self.atlas.rotation_steps
+        blit_sequence = []
+        sprites_by_color = {}
+
+        for agent in agents:
+            color = blue if agent is selected_agent else agent.color
+            sprites = sprites_by_color.get(color)
+            if sprites is None:
+                sprites = self.atlas.get_sprites(color)
+                sprites_by_color[color] = sprites
+
+            surface, sprite_x, sprite_y = sprites[round(agent.rotation * rotation_steps / 360) % rotation_steps]
+            blit_sequence.append((surface, (agent.x * scale + sprite_x + offset_x,
+                                            agent.y * scale + sprite_y + offset_y)))
+
+        screen.blits(blit_sequence, doreturn=False)
+
+    def draw_sensors(self, screen, agents, offset: Tuple[float, float] = (0, 0), scale: float = 1.0):
+        """
+        Draw the sensor rays of all agents. Rays with a collision end at the collision point and are drawn red with a
+        marker at the collision, the others are drawn green.
+        :param screen: Surface to draw on.
+        :param agents: Agents to draw the sensors of.
+        :param offset: Screen position of the world origin.
+        :param scale: Screen pixels per world unit.
+        """
+        offset_x, offset_y = offset
+        marker_blits = []
+        marker_surface = self.marker_surface
+        marker_radius = self.marker_radius
+
+        for agent in agents:
+            sensor = agent.vision_sensor
+            location = (agent.x * scale + offset_x, agent.y * scale + offset_y)
+
+            # All rays of one color form a fan that starts and ends at the agent, so they can be drawn as one polyline
+            free_rays = [location]
+            colliding_rays = [location]
+            for i, collision_distance in enumerate(sensor.collision_distance):
+                if math.isnan(collision_distance):
+                    free_rays.append((sensor.sensor_x[i] * scale + offset_x, sensor.sensor_y[i] * scale + offset_y))
+                    free_rays.append(location)
+                else:
+                    collision_point = (sensor.collision_x[i] * scale + offset_x,
+                                       sensor.collision_y[i] * scale + offset_y)
+                    colliding_rays.append(collision_point)
+                    colliding_rays.append(location)
+                    marker_blits.append((marker_surface, (collision_point[0] - marker_radius,
+                                                          collision_point[1] - marker_radius)))
+
+            if len(free_rays) > 1:
+                pygame.draw.lines(screen, green, False, free_rays)
+            if len(colliding_rays) > 1:
+                pygame.draw.lines(screen, red, False, colliding_rays)
+
+        screen.blits(marker_blits, doreturn=False)
+
+    def draw_location_markers(self, screen, agents, offset: Tuple[float, float] = (0, 0), scale: float = 1.0):
+        """
+        Draw a marker at the location of every agent in one batched blit.
+        """
+        offset_x = offset[0] - self.marker_radius
+        offset_y = offset[1] - self.marker_radius
+        marker_surface = self.marker_surface
+        screen.blits([(marker_surface, (agent.x * scale + offset_x, agent.y * scale + offset_y)) for agent in agents],
+                     doreturn=False)
@@ -0,0 +1,84 @@
+from typing import Tuple
+
+
+class TextCache:
+    """
+    Caches rendered text surfaces of one font. The following kinds of text are supported:
+    - Static labels that never change are rendered once and kept forever.
+    - Numeric labels are composed from a static prefix/suffix and cached per-character glyphs, so changing numbers
+      never need a font render.
+    - Labels mixing static text and changing values (e.g. per agent infos) are composed the same way.
+    """
+
+    def __init__(self, font, antialias: bool = True):
+        """
+        :param font: pygame font used for rendering.
+        :param antialias: Render the text antialiased.
+        """
+        self.font = font
+        self.antialias = antialias
+
+        self.static_labels = {}  # (text, color) -> surface
+        self.glyphs = {}  # (character, color) -> surface
+
+    def static_label(self, text: str, color: Tuple[int, int, int]):
+        """
+        :return: Surface of a text that is rendered only once.
+        """
+        key = (text, color)
+        surface = self.static_labels.get(key)
+        if surface is None:
+            surface = self.font.render(text, self.antialias, color)
+            self.static_labels[key] = surface
+        return surface
+
+    def glyph(self, character: str, color: Tuple[int, int, int]):
+        """
+        :return: Surface of a single character.
+        """
+        key = (character, color)
+        surface = self.glyphs.get(key)
+        if surface is None:
+            surface = self.font.render(character, self.antialias, color)
+            self.glyphs[key] = surface
+        return surface
+
+    def label_blits(self, position: Tuple[float, float], parts, color: Tuple[int, int, int] = (255, 255, 255)):
+        """
+        Compose a label from parts without any font render. Strings are static labels, all other parts (e.g. numbers)
+        are converted with str() and composed from cached glyphs.
+        :param position: Top left position of the label.
+        :param parts: Sequence of static strings and changing values, e.g. ("(", x, ",", y, ")").
+        :param color: Text color.
+        :return: List of (surface, position) tuples for Surface.blits.
+        """
+        x, y = position
+        blit_sequence = []
+
+        for part in parts:
+            if isinstance(part, str):
+                if part:
+                    surface = self.static_label(part, color)
+                    blit_sequence.append((surface, (x, y)))
+                    x += surface.get_width()
+            else:
+                for character in str(part):
+                    surface = self.glyph(character, color)
+                    blit_sequence.append((surface, (x, y)))
+                    x += surface.get_width()
+
+        return blit_sequence
+
+    def draw_number_label(self, screen, position: Tuple[int, int], prefix: str, number, suffix: str = "",
+                          color: Tuple[int, int, int] = (255, 255, 255)):
+        """
+        Draw a label of the form prefix + number + suffix. Prefix and suffix are static labels, the number is composed
+        from cached glyphs.
+        :param screen: Surface to draw on.
+        :param position: Top left position of the label.
+        :param prefix: Static text before the number.
+        :param number: Value that is converted with str().
+        :param suffix: Static text after the number.
+        :param color: Text color.
+        """
+        screen.blits(self.label_blits(position, (prefix, number, suffix), color), doreturn=False)
@@ -0,0 +1,156 @@
+import time
+import numpy as np
+import pygame
+from typing import Tuple
+
+
+class Viewport:
+    """
+    Pannable and zoomable view on the simulation world. Separates world coordinates from screen coordinates:
+    screen = (world - offset) * zoom.
+    """
+
+    def __init__(self, screen_size: Tuple[int, int], world_size: Tuple[int, int], zoom: float = 1.0,
+                 min_zoom: float = 0.01, max_zoom: float = 8.0, density_view_zoom: float = 0.35,
+                 pan_speed: float = 600):
+        """
+        :param screen_size: Size of the surface the view is drawn on.
+        :param world_size: Size of the simulation area.
+        :param zoom: Initial zoom factor (screen pixels per world unit).
+        :param min_zoom: Smallest allowed zoom factor.
+        :param max_zoom: Largest allowed zoom factor.
+        :param density_view_zoom: Below this zoom factor agents are drawn as an aggregated density map.
+        :param pan_speed: Keyboard panning speed in screen pixels per second.
+        """
+        self.screen_size = screen_size
+        self.world_size = world_size
+        self.zoom = zoom
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.density_view_zoom = density_view_zoom
+        self.pan_speed = pan_speed
+
+        # World coordinates of the top left screen corner
+        self.offset_x = 0.0
+        self.offset_y = 0.0
+
+        self.dragging = False
+        self.last_key_update = None
+
+    @property
+    def show_density(self) -> bool:
+        return self.zoom < self.density_view_zoom
+
+    def world_to_screen(self, x: float, y: float):
+        return (x - self.offset_x) * self.zoom, (y - self.offset_y) * self.zoom
+
+    def screen_to_world(self, x: float, y: float):
+        return x / self.zoom + self.offset_x, y / self.zoom + self.offset_y
+
+    def visible_rect(self, margin: float = 0):
+        """
+        :param margin: Extra world units added on every side.
+        :return: Visible world area as (x0, y0, x1, y1).
+        """
+        return (self.offset_x - margin, self.offset_y - margin,
+                self.offset_x + self.screen_size[0] / self.zoom + margin,
+                self.offset_y + self.screen_size[1] / self.zoom + margin)
+
+    def shows_whole_world(self) -> bool:
+        x0, y0, x1, y1 = self.visible_rect()
+        return x0 <= 0 and y0 <= 0 and x1 >= self.world_size[0] and y1 >= self.world_size[1]
+
+    def get_transform(self):
+        """
+        :return: Tuple (offset, scale) for drawing world coordinates with screen = world * scale + offset.
+        """
+        return (-self.offset_x * self.zoom, -self.offset_y * self.zoom), self.zoom
+
+    def pan(self, delta_x: float, delta_y: float):
+        """
+        Move the view by a distance in screen pixels.
+        """
+        self.offset_x += delta_x / self.zoom
+        self.offset_y += delta_y / self.zoom
+
+    def zoom_at(self, factor: float, screen_position: Tuple[float, float]):
+        """
+        Zoom in or out while keeping the world point under the screen position in place.
+        """
+        world_x, world_y = self.screen_to_world(*screen_position)
+        self.zoom = max(self.min_zoom, min(self.zoom * factor, self.max_zoom))
+        self.offset_x = world_x - screen_position[0] / self.zoom
+        self.offset_y = world_y - screen_position[1] / self.zoom
+
+    def zoom_to_fit(self):
+        """
+        Zoom so the whole world fits on the screen and center it.
+        """
+        self.zoom = max(self.min_zoom, min(self.screen_size[0] / self.world_size[0],
+                                           self.screen_size[1] / self.world_size[1], self.max_zoom))
+        self.offset_x = (self.world_size[0] - self.screen_size[0] / self.zoom) / 2
+        self.offset_y = (self.world_size[1] - self.screen_size[1] / self.zoom) / 2
+
+    def process_event(self, event) -> bool:
+        """
+        Handle zooming with the mouse wheel and panning by dragging with the right or middle mouse button.
+        :return: True if the event was used by the viewport.
+        """
+        if event.type == pygame.MOUSEWHEEL:
+            self.zoom_at(1.15 ** event.y, pygame.mouse.get_pos())
+            return True
+
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            if event.button in (2, 3):
+                self.dragging = True
+                return True
+            # Wheel scrolling also creates button events, they are handled by MOUSEWHEEL
+            return event.button in (4, 5)
+
+        if event.type == pygame.MOUSEBUTTONUP and event.button in (2, 3):
+            self.dragging = False
+            return True
+
+        if event.type == pygame.MOUSEMOTION and self.dragging:
+            self.pan(-event.rel[0], -event.rel[1])
+            return True
+
+        return False
+
+    def process_keys(self):
+        """
+        Pan with the arrow keys. The distance depends on the time since the last call, so the speed is independent of
+        the frame rate.
+        """
+        now = time.time()
+        delta_time = min(now - self.last_key_update, 0.1) if self.last_key_update is not None else 0
+        self.last_key_update = now
+
+        keys = pygame.key.get_pressed()
+        distance = self.pan_speed * delta_time
+        self.pan((keys[pygame.K_RIGHT] - keys[pygame.K_LEFT]) * distance,
+                 (keys[pygame.K_DOWN] - keys[pygame.K_UP]) * distance)
+
+    def draw_density(self, screen, xs, ys, color: Tuple[int, int, int], cell_pixels: int = 4):
+        """
+        Draw points as a density map aggregated over screen cells. Empty cells stay transparent.
+        :param screen: Surface to draw on.
+        :param xs: World x coordinates of the points.
+        :param ys: World y coordinates of the points.
+        :param color: Color of the densest cells.
+        :param cell_pixels: Width and height of one density cell on the screen.
+        """
+        x0, y0, x1, y1 = self.visible_rect()
+        bins_x = max(1, self.screen_size[0] // cell_pixels)
+        bins_y = max(1, self.screen_size[1] // cell_pixels)
+        counts, _, _ = np.histogram2d(xs, ys, bins=(bins_x, bins_y), range=((x0, x1), (y0, y1)))
+
+        # Logarithmic intensity, so single agents stay visible next to crowds
+        intensity = np.log1p(counts)
+        if intensity.max() > 0:
+            intensity /= intensity.max()
+        pixels = (intensity[:, :, None] * np.array(color, dtype=np.float64)).astype(np.uint8)
+
+        density_surface = pygame.surfarray.make_surface(pixels)
+        density_surface.set_colorkey((0, 0, 0))
+        screen.blit(pygame.transform.scale(density_surface, (bins_x * cell_pixels, bins_y * cell_pixels)), (0, 0))
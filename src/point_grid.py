@@ -0,0 +1,113 @@
+import numpy as np
+
+# Neighbour cell offsets for pair search. Only half of the 3x3 neighbourhood is needed, as every pair of neighbouring
+# cells is visited once from one of its two cells.
+HALF_NEIGHBOURHOOD = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+class PointGrid:
+    """
+    Uniform grid over a set of points, stored as the point indices sorted by cell key. Building and querying is done
+    with numpy operations, so the grid can be rebuilt every tick for large numbers of moving points (e.g. agents).
+    """
+
+    def __init__(self, xs, ys, cell_size: float):
+        """
+        :param xs: X coordinates of the points.
+        :param ys: Y coordinates of the points.
+        :param cell_size: Width and height of one grid cell.
+        """
+        self.cell_size = cell_size
+        self.xs = np.asarray(xs, dtype=np.float64)
+        self.ys = np.asarray(ys, dtype=np.float64)
+
+        self.cell_x = np.floor(self.xs / cell_size).astype(np.int64)
+        self.cell_y = np.floor(self.ys / cell_size).astype(np.int64)
+
+        # Cells are numbered column by column. The column height leaves one unused row above and below the points, so
+        # keys of neighbouring cells never wrap into the next column.
+        if len(self.xs):
+            self.min_cell_x = int(self.cell_x.min())
+            self.max_cell_x = int(self.cell_x.max())
+            self.min_cell_y = int(self.cell_y.min()) - 1
+            self.column_height = int(self.cell_y.max()) - self.min_cell_y + 2
+        else:
+            self.min_cell_x = 0
+            self.max_cell_x = -1
+            self.min_cell_y = 0
+            self.column_height = 1
+        self.keys = self._cell_keys(self.cell_x, self.cell_y)
+
+        self.order = np.argsort(self.keys, kind="stable")
+        self.sorted_keys = self.keys[self.order]
+
+    def _cell_keys(self, cell_x, cell_y):
+        return cell_x * self.column_height + (cell_y - self.min_cell_y)
+
+    def _expand_ranges(self, owners, starts, ends):
+        """
+        Turn per owner ranges into the sorted positions of the range elements.
+        :return: Tuple of (owner per element, sorted position per element).
+        """
+        counts = ends - starts
+        total = int(counts.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        repeated_owners = np.repeat(owners, counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        return repeated_owners, np.repeat(starts, counts) + offsets
+
+    def candidate_pairs(self):
+        """
+        Broad phase: all pairs of points in the same or in neighbouring cells. Every pair is returned once.
+        :return: Tuple of index arrays (i, j).
+        """
+        all_i = []
+        all_j = []
+        point_indices = np.arange(len(self.xs))
+
+        for offset_x, offset_y in HALF_NEIGHBOURHOOD:
+            neighbour_keys = self._cell_keys(self.cell_x + offset_x, self.cell_y + offset_y)
+            starts = np.searchsorted(self.sorted_keys, neighbour_keys, side="left")
+            ends = np.searchsorted(self.sorted_keys, neighbour_keys, side="right")
+
+            i, sorted_positions = self._expand_ranges(point_indices, starts, ends)
+            j = self.order[sorted_positions]
+
+            # Within the own cell, only keep every pair once and skip the point itself
+            if offset_x == 0 and offset_y == 0:
+                keep = i < j
+                i, j = i[keep], j[keep]
+
+            all_i.append(i)
+            all_j.append(j)
+
+        return np.concatenate(all_i), np.concatenate(all_j)
+
+    def query_rect(self, x0: float, y0: float, x1: float, y1: float):
+        """
+        Get the indices of all points within the area (x0, y0) - (x1, y1).
+        :return: Index array.
+        """
+        if len(self.xs) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        # Clamp the queried cell rows to the rows that contain points, so keys stay within their column
+        first_row = max(int(np.floor(y0 / self.cell_size)), self.min_cell_y + 1)
+        last_row = min(int(np.floor(y1 / self.cell_size)), self.min_cell_y + self.column_height - 2)
+        if first_row > last_row:
+            return np.empty(0, dtype=np.int64)
+
+        # Every column of cells is one contiguous key range. Only columns that contain points are searched.
+        columns = np.arange(max(int(np.floor(x0 / self.cell_size)), self.min_cell_x),
+                            min(int(np.floor(x1 / self.cell_size)), self.max_cell_x) + 1)
+        starts = np.searchsorted(self.sorted_keys, self._cell_keys(columns, first_row), side="left")
+        ends = np.searchsorted(self.sorted_keys, self._cell_keys(columns, last_row), side="right")
+        _, sorted_positions = self._expand_ranges(columns, starts, ends)
+        indices = self.order[sorted_positions]
+
+        # Exact check, the border cells can contain points outside of the area
+        xs = self.xs[indices]
+        ys = self.ys[indices]
+        return indices[(xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)]
@@ -0,0 +1,279 @@
+"""
+Optimization of parameterized policies (see agent_policy.ParameterizedPolicy) with an evolution strategy.
+
+Every candidate parameter vector is scored by headless, seeded rollouts: a simulation in which all agents use the
+candidate policy runs for a fixed number of steps and a fitness function rates the collected analytics. Rollouts are
+distributed over worker processes and their fitness is cached by (parameters, seed), optionally on disk, so repeated
+evaluations and restarted runs do not simulate the same rollout twice.
+
+    optimizer = PolicyOptimizer(ParameterizedAvoidancePolicy, fitness="safe_distance", num_steps=500)
+    best_parameters = optimizer.run(generations=100)
+"""
+import hashlib
+import multiprocessing
+import os
+import pickle
+from typing import Tuple
+
+import numpy as np
+
+from src.scenario import Scenario
+from src.simulation import Simulation
+
+
+def distance_fitness(snapshot: dict) -> float:
+    """
+    :return: Average distance travelled per agent and step.
+    """
+    return float(snapshot["distance_travelled"].mean()) / snapshot["ticks"]
+
+
+def collision_avoidance_fitness(snapshot: dict) -> float:
+    """
+    :return: Negative number of obstacle collisions per agent and step. Note that agents that do not move never collide.
+    """
+    return -snapshot["total_collisions"] / (len(snapshot["agent_ids"]) * snapshot["ticks"])
+
+
+def safe_distance_fitness(snapshot: dict, collision_penalty: float = 5) -> float:
+    """
+    :return: Distance per agent and step minus a penalty per collision. Rewards moving without hitting obstacles.
+    """
+    return distance_fitness(snapshot) + collision_penalty * collision_avoidance_fitness(snapshot)
+
+
+# Fitness functions by name. Own functions have to be defined at module level, so worker processes can load them.
+FITNESS_FUNCTIONS = {
+    "distance": distance_fitness,
+    "collision_avoidance": collision_avoidance_fitness,
+    "safe_distance": safe_distance_fitness
+}
+
+
+def run_rollout(policy_class, parameters, seed: int, fitness, size: Tuple[int, int] = (800, 600),
+                number_of_agents: int = 20, num_steps: int = 300, scenario_path: str = None,
+                world_cache_dir: str = None) -> float:
+    """
+    Simulate one headless rollout in which all agents use the given policy and rate it.
+    :param policy_class: ParameterizedPolicy subclass.
+    :param parameters: Parameter vector of the policy.
+    :param seed: Seed of the world, the agents and the policy randomness.
+    :param fitness: Function that rates the analytics snapshot at the end of the rollout.
+    :param size: Size of the random world. Not used with a scenario.
+    :param number_of_agents: Number of agents. Not used with a scenario.
+    :param num_steps: Number of simulation steps.
+    :param scenario_path: Scenario file for the rollout. Its seed is replaced by the rollout seed and no player
+                          controlled agent is spawned, since it would not move without keyboard input.
+    :param world_cache_dir: Directory for caching the generated worlds.
+    :return: Fitness of the rollout.
+    """
+    policy = policy_class(parameters)
+
+    if scenario_path is not None:
+        scenario = Scenario(dict(Scenario.load(scenario_path).definition, seed=seed, player_controlled_agent=False))
+        simulation = Simulation.from_scenario(scenario, world_cache_dir=world_cache_dir, analytics=True)
+    else:
+        simulation = Simulation(size=size, number_of_agents=number_of_agents, seed=seed,
+                                world_cache_dir=world_cache_dir, analytics=True)
+
+    for agent in simulation.agents:
+        agent.policy = policy
+    simulation.compute_sensors = True
+
+    for _ in range(num_steps):
+        simulation.update()
+
+    return fitness(simulation.analytics.snapshot())
+
+
+def _run_rollout_task(task):
+    parameters, seed, rollout_kwargs = task
+    return run_rollout(parameters=parameters, seed=seed, **rollout_kwargs)
+
+
+class EvolutionStrategy:
+    """
+    Evolution strategy with antithetic sampling and rank based fitness shaping. Candidates are sampled in pairs
+    mean +- sigma * noise and the mean moves along the fitness weighted noise. Using ranks instead of raw fitness values
+    makes the update independent of the fitness scale and robust against outliers.
+    """
+
+    def __init__(self, initial_parameters, sigma: float = 0.1, learning_rate: float = 0.05, population_size: int = 16,
+                 seed: int = None):
+        """
+        :param initial_parameters: Start of the search.
+        :param sigma: Standard deviation of the parameter noise.
+        :param learning_rate: Step size of the mean update.
+        :param population_size: Number of candidates per generation. Rounded up to an even number.
+        :param seed: Seed of the noise sampling.
+        """
+        self.mean = np.array(initial_parameters, dtype=np.float64)
+        self.sigma = sigma
+        self.learning_rate = learning_rate
+        self.population_size = population_size + population_size % 2
+        self.rng = np.random.default_rng(seed)
+        self.noise = None
+
+    def ask(self):
+        """
+        :return: List of candidate parameter vectors of the next generation.
+        """
+        half_noise = self.rng.standard_normal((self.population_size // 2, len(self.mean)))
+        self.noise = np.concatenate((half_noise, -half_noise))
+        return list(self.mean + self.sigma * self.noise)
+
+    def tell(self, fitnesses):
+        """
+        Update the mean with the fitness of the candidates returned by the last ask().
+        :param fitnesses: Fitness per candidate, higher is better.
+        """
+        # Centered ranks in [-0.5, 0.5]
+        ranks = np.empty(len(fitnesses))
+        ranks[np.argsort(fitnesses)] = np.arange(len(fitnesses))
+        weights = ranks / (len(fitnesses) - 1) - 0.5
+
+        gradient = weights @ self.noise / (len(fitnesses) * self.sigma)
+        self.mean = self.mean + self.learning_rate * gradient
+
+
+class PolicyOptimizer:
+    """
+    Tunes the parameters of a policy with an evolution strategy. Every candidate is rated by the average fitness over
+    the same rollout seeds, so all candidates of a run are compared on the same worlds and spawn situations.
+    """
+
+    def __init__(self, policy_class, fitness="safe_distance", initial_parameters=None, seeds=(0, 1, 2, 3),
+                 size: Tuple[int, int] = (800, 600), number_of_agents: int = 20, num_steps: int = 300,
+                 scenario_path: str = None, sigma: float = 0.1, learning_rate: float = 0.05,
+                 population_size: int = 16, num_workers: int = None, cache_dir: str = None,
+                 world_cache_dir: str = None, seed: int = None):
+        """
+        :param policy_class: ParameterizedPolicy subclass to optimize.
+        :param fitness: Name in FITNESS_FUNCTIONS or a module level function that rates an analytics snapshot.
+        :param initial_parameters: Start of the search. Defaults to the default parameters of the policy.
+        :param seeds: Rollout seeds every candidate is evaluated on.
+        :param size: Size of the random rollout worlds.
+        :param number_of_agents: Number of agents per rollout.
+        :param num_steps: Simulation steps per rollout.
+        :param scenario_path: Scenario file for the rollouts instead of random worlds.
+        :param sigma: Standard deviation of the parameter noise.
+        :param learning_rate: Step size of the parameter update.
+        :param population_size: Number of candidates per generation.
+        :param num_workers: Number of rollout processes. Defaults to the number of CPUs, 1 runs in this process.
+        :param cache_dir: Directory for persisting the fitness cache across runs.
+        :param world_cache_dir: Directory for caching the rollout worlds.
+        :param seed: Seed of the evolution strategy.
+        """
+        self.policy_class = policy_class
+        self.fitness = FITNESS_FUNCTIONS[fitness] if isinstance(fitness, str) else fitness
+        self.seeds = tuple(seeds)
+        self.num_workers = num_workers or os.cpu_count()
+        self.rollout_kwargs = {"policy_class": policy_class, "fitness": self.fitness, "size": tuple(size),
+                               "number_of_agents": number_of_agents, "num_steps": num_steps,
+                               "scenario_path": scenario_path, "world_cache_dir": world_cache_dir}
+
+        if initial_parameters is None:
+            initial_parameters = policy_class.default_parameters
+        self.strategy = EvolutionStrategy(initial_parameters, sigma=sigma, learning_rate=learning_rate,
+                                          population_size=population_size, seed=seed)
+
+        # Fitness per (parameters, seed). The file name depends on everything else that influences a rollout. Scenarios
+        # are identified by their content, so an edited scenario file does not reuse stale results.
+        self.cache_path = None
+        self.fitness_cache = {}
+        if cache_dir is not None:
+            scenario_hash = None
+            if scenario_path is not None:
+                scenario_hash = Scenario.load(scenario_path).definition_hash(exclude=("seed",))
+            settings = (policy_class.__module__, policy_class.__qualname__, self.fitness.__module__,
+                        self.fitness.__qualname__, tuple(size), number_of_agents, num_steps, scenario_hash)
+            settings_hash = hashlib.sha256(repr(settings).encode()).hexdigest()[:32]
+            self.cache_path = os.path.join(cache_dir, f"fitness_{settings_hash}.pickle")
+            try:
+                with open(self.cache_path, "rb") as cache_file:
+                    self.fitness_cache = pickle.load(cache_file)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+
+        self.cache_hits = 0
+        self.rollouts = 0
+        self.history = []
+        self.best_parameters = tuple(float(p) for p in self.strategy.mean)
+        self.best_fitness = None
+
+    def evaluate(self, candidates, pool=None):
+        """
+        Rate parameter vectors by their average fitness over all rollout seeds. Cached rollouts are not simulated again.
+        :param candidates: List of parameter vectors.
+        :param pool: multiprocessing pool for the rollouts. If None, they run in this process.
+        :return: List of fitness values, one per candidate.
+        """
+        candidates = [tuple(float(p) for p in candidate) for candidate in candidates]
+
+        # Collect the rollouts that are not cached yet, each only once
+        missing = list(dict.fromkeys((candidate, seed) for candidate in candidates for seed in self.seeds
+                                     if (candidate, seed) not in self.fitness_cache))
+        self.cache_hits += len(candidates) * len(self.seeds) - len(missing)
+        self.rollouts += len(missing)
+
+        tasks = [(candidate, seed, self.rollout_kwargs) for candidate, seed in missing]
+        results = pool.map(_run_rollout_task, tasks, chunksize=1) if pool is not None else map(_run_rollout_task, tasks)
+        for key, fitness in zip(missing, results):
+            self.fitness_cache[key] = fitness
+
+        return [sum(self.fitness_cache[(candidate, seed)] for seed in self.seeds) / len(self.seeds)
+                for candidate in candidates]
+
+    def run(self, generations: int, callback=None):
+        """
+        Optimize the policy parameters.
+        :param generations: Number of generations.
+        :param callback: Called after every generation with a dictionary of statistics, e.g. for progress output.
+        :return: Best parameter vector found.
+        """
+        pool = multiprocessing.Pool(self.num_workers) if self.num_workers > 1 else None
+        try:
+            for _ in range(generations):
+                candidates = self.strategy.ask()
+                rated_mean = tuple(float(p) for p in self.strategy.mean)
+                # The current mean is rated along with the candidates, so the best result is a tested vector
+                fitnesses = self.evaluate(candidates + [self.strategy.mean], pool)
+                mean_fitness = fitnesses.pop()
+
+                for parameters, fitness in zip([rated_mean] + candidates, [mean_fitness] + fitnesses):
+                    if self.best_fitness is None or fitness > self.best_fitness:
+                        self.best_fitness = fitness
+                        self.best_parameters = tuple(float(p) for p in parameters)
+
+                self.strategy.tell(fitnesses)
+                self._save_cache()
+
+                stats = {"generation": len(self.history),
+                         "mean_parameters": rated_mean,
+                         "mean_fitness": mean_fitness,
+                         "population_average_fitness": sum(fitnesses) / len(fitnesses),
+                         "population_best_fitness": max(fitnesses),
+                         "best_fitness": self.best_fitness,
+                         "best_parameters": self.best_parameters,
+                         "rollouts": self.rollouts,
+                         "cache_hits": self.cache_hits}
+                self.history.append(stats)
+                if callback is not None:
+                    callback(stats)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        return self.best_parameters
+
+    def _save_cache(self):
+        if self.cache_path is None:
+            return
+
+        # Write to a temporary file first, so parallel runs never read a partially written cache file
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as cache_file:
+            pickle.dump(self.fitness_cache, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.cache_path)
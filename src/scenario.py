@@ -0,0 +1,198 @@
+"""
+Scenario files are JSON documents that describe a complete simulation setup:
+
+{
+    "size": [1280, 720],
+    "seed": 1,
+    "border": {"thickness": 50},
+    "obstacles": [{"x": 200, "y": 100, "width": 300, "height": 50}],
+    "random_obstacles": {"count": 5, "width": {"randint": [50, 500]}, "height": {"randint": [50, 500]}},
+    "player_controlled_agent": true,
+    "agent_collisions": {"radius": 6},
+    "agents": [
+        {
+            "count": 50,
+            "policy": "collision_avoidance",
+            "movement_speed": {"randint": [1, 5]},
+            "turning_speed": 10,
+            "color": [155, 155, 255],
+            "spawn_separation": 10,
+            "sensors": {"num_rays": {"randint": [3, 20]}, "fov": {"uniform": [30, 120]}, "length": 100}
+        }
+    ]
+}
+
+"agent_collisions" is either true/false or a dict of settings, which also enables them. A missing key disables agent
+collisions.
+
+Every numeric agent or sensor parameter is either a constant or a distribution: {"randint": [a, b]},
+{"uniform": [a, b]} or {"choice": [...]}. All keys except "size" are optional. Populations with a parameterized
+policy (e.g. "parameterized_avoidance") take the parameter vector from "policy_parameters", for example the result of
+a policy optimization run.
+"""
+
+import hashlib
+import json
+import random
+from typing import Tuple
+
+from src.sim_objects.agent import Agent
+from src.sim_objects.agent_policy import POLICIES, ParameterizedPolicy
+from src.sim_objects.obstacle import ObstacleRect
+from src.world import World, WORLD_CACHE_VERSION
+
+
+def sample_value(value, rng=random):
+    """
+    Resolve a scenario parameter to a concrete value.
+    :param value: Constant or distribution definition.
+    :param rng: Random generator used for sampling.
+    :return: Sampled value.
+    """
+    if not isinstance(value, dict):
+        return value
+
+    if "randint" in value:
+        return rng.randint(*value["randint"])
+    if "uniform" in value:
+        return rng.uniform(*value["uniform"])
+    if "choice" in value:
+        return rng.choice(value["choice"])
+
+    raise ValueError(f"Unknown parameter distribution: {value}")
+
+
+class Scenario:
+    """
+    Declarative description of a simulation world and its agent populations.
+    """
+
+    # Keys that influence the world geometry. Only these are part of the world cache key.
+    geometry_keys = ("size", "seed", "border", "obstacles", "random_obstacles")
+
+    def __init__(self, definition: dict):
+        """
+        :param definition: Parsed scenario file content.
+        """
+        if "size" not in definition:
+            raise ValueError("Scenario is missing the required key 'size'")
+
+        self.definition = definition
+        self.size: Tuple[int, int] = tuple(definition["size"])
+        self.seed = definition.get("seed")
+        self.player_controlled_agent = definition.get("player_controlled_agent", False)
+        self.populations = definition.get("agents", [])
+
+        for population in self.populations:
+            policy_name = population.get("policy")
+            if policy_name is not None and policy_name not in POLICIES:
+                raise ValueError(f"Unknown policy '{policy_name}'. Available policies: {', '.join(POLICIES)}")
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Load a scenario from a JSON file.
+        :param path: Path of the scenario file.
+        :return: Scenario instance.
+        """
+        with open(path, "r", encoding="utf-8") as scenario_file:
+            return cls(json.load(scenario_file))
+
+    @property
+    def number_of_agents(self) -> int:
+        return sum(population.get("count", 0) for population in self.populations)
+
+    def geometry_hash(self) -> str:
+        """
+        Content hash of the geometry relevant part of the scenario. Agent populations do not change the compiled world,
+        so scenarios that only differ in their agents share the cached world.
+        """
+        geometry = {key: self.definition.get(key) for key in Scenario.geometry_keys}
+        canonical = json.dumps(geometry, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(f"{WORLD_CACHE_VERSION}:{canonical}".encode()).hexdigest()
+
+    def definition_hash(self, exclude=()) -> str:
+        """
+        Content hash of the whole scenario definition, independent of key order and formatting of the file.
+        :param exclude: Keys that are left out, e.g. a seed that is replaced anyway.
+        """
+        definition = {key: value for key, value in self.definition.items() if key not in exclude}
+        canonical = json.dumps(definition, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get_obstacle_rects(self):
+        """
+        Resolve fixed, random and border obstacles into a list of rects.
+        """
+        size = self.size
+        obstacle_rects = [ObstacleRect(obstacle["x"], obstacle["y"], obstacle["width"], obstacle["height"])
+                          for obstacle in self.definition.get("obstacles", [])]
+
+        # Random obstacles use an own generator, so the global random state does not depend on cache hits
+        random_obstacles = self.definition.get("random_obstacles")
+        if random_obstacles is not None:
+            rng = random.Random(self.seed)
+            for _ in range(random_obstacles.get("count", 0)):
+                width = sample_value(random_obstacles.get("width", {"randint": [50, 500]}), rng)
+                height = sample_value(random_obstacles.get("height", {"randint": [50, 500]}), rng)
+                obstacle_rects.append(ObstacleRect(rng.randint(0, max(0, size[0] - width)),
+                                                   rng.randint(0, max(0, size[1] - height)), width, height))
+
+        border = self.definition.get("border")
+        if border is not None:
+            thickness = border.get("thickness", 20)
+            obstacle_rects += [
+                ObstacleRect(0, 0, thickness, size[1]),
+                ObstacleRect(0, 0, size[0], thickness),
+                ObstacleRect(size[0] - thickness, 0, thickness, size[1]),
+                ObstacleRect(0, size[1] - thickness, size[0], thickness)
+            ]
+
+        return obstacle_rects
+
+    def compile(self, cache_dir: str = None) -> World:
+        """
+        Compile the scenario geometry into a world with obstacle edges, edge index and spawn table.
+        :param cache_dir: Directory for caching the compiled world, keyed by the geometry hash. Not used for random
+                          obstacles without a seed.
+        :return: World instance.
+        """
+        # Random obstacles without a seed give a new layout every time, so there is nothing to cache
+        if "random_obstacles" in self.definition and self.seed is None:
+            cache_dir = None
+
+        return World.load_or_build(cache_key=("scenario", self.geometry_hash()),
+                                   build_function=lambda: World(self.size, self.get_obstacle_rects()),
+                                   cache_dir=cache_dir)
+
+    def spawn_agents(self, simulation):
+        """
+        Create all agent populations of the scenario and add them to the simulation.
+        :param simulation: Simulation instance with an initialized world.
+        """
+        for population in self.populations:
+            count = population.get("count", 0)
+            sensors = population.get("sensors", {})
+            policy_name = population.get("policy")
+            policy = POLICIES[policy_name] if policy_name is not None else None
+
+            # Parameterized policies are shared instances with the parameters of the population
+            if isinstance(policy, type) and issubclass(policy, ParameterizedPolicy):
+                policy = policy(population.get("policy_parameters"))
+
+            spawn_locations = simulation.spawn_sampler.sample(count,
+                                                              min_separation=population.get("spawn_separation", 0))
+
+            for spawn_location in spawn_locations:
+                color = population.get("color")
+                new_agent = Agent(simulation=simulation,
+                                  movement_speed=sample_value(population.get("movement_speed", 10)),
+                                  turning_speed=sample_value(population.get("turning_speed", 10)),
+                                  num_vision_sensors=sample_value(sensors.get("num_rays", 3)),
+                                  vision_sensors_fov=sample_value(sensors.get("fov", 75)),
+                                  vision_sensors_length=sample_value(sensors.get("length", 30)),
+                                  location=spawn_location,
+                                  policy=policy)
+                if color is not None:
+                    new_agent.color = tuple(sample_value(color))
+                simulation.agents.append(new_agent)
@@ -1,6 +1,6 @@
-import pygame
 import random
 import math
+import sys
 
 from src.colors import *
 from src.sim_objects.agent_vision_sensor import VisionSensor
@@ -8,44 +8,61 @@ from src import utils
 
 
 class Agent:
+    __slots__ = ("agent_id", "movement_speed", "turning_speed", "color", "x", "y", "prev_x", "prev_y",
+                 "rotation", "vision_sensor", "policy")
+
     num_of_agents = 0
 
     def __init__(self, simulation, movement_speed: int = 10, turning_speed: int = 10, color=white,
-                 num_vision_sensors: int = 3, vision_sensors_fov: int = 75, vision_sensors_length: int = 30):
-        self.simulation = simulation
+                 num_vision_sensors: int = 3, vision_sensors_fov: int = 75, vision_sensors_length: int = 30,
+                 location: (int, int) = None, policy=None):
+        # The simulation is only used to sample a spawn location. Agents keep no reference to it, the simulation passes
+        # the area size and the edge index to update() and sensor_collision_detection().
+        self.policy = policy  # Fixed policy of the agent. If None, the simulation decides.
         self.movement_speed = movement_speed
         self.turning_speed = turning_speed
 
         self.color = color
 
-        # Determine start location and rotation
-        while True:
-            self.location = (random.randint(0, self.simulation.size[0]-1),
-                             random.randint(0, self.simulation.size[1]-1))
-
-            # Check if point does not collide with a obstacle in the simulation
-            no_collision = True
-            for obstacle in self.simulation.obstacles:
-                # If collision is detected, calculate collision coords and move agent to them
-                if obstacle.rect.collidepoint(self.location[0], self.location[1]):
-                    no_collision = False
-
-            if no_collision:
-                break
+        # Determine start location and rotation. Without a given location, a free spot is sampled from the simulation.
+        if location is None:
+            location = simulation.spawn_sampler.sample(1)[0]
+        self.x, self.y = location
 
         self.rotation = random.randint(0, 359)
-        self.prev_location = self.location
+        self.prev_x = self.x
+        self.prev_y = self.y
 
-        # Set instance name and iterate name value
-        self.name = "agent_" + str(Agent.num_of_agents)
+        # Set instance id and iterate id value. The name is derived from the id on access.
+        self.agent_id = Agent.num_of_agents
         Agent.num_of_agents += 1
 
         # Initialize vision sensors
         self.vision_sensor = VisionSensor(self, num_of_rays=num_vision_sensors, ray_length=vision_sensors_length,
                                           fov=vision_sensors_fov)
 
-    def update(self, policy):
+    @property
+    def name(self):
+        return "agent_" + str(self.agent_id)
+
+    @property
+    def location(self):
+        return self.x, self.y
 
+    @location.setter
+    def location(self, coordinates):
+        self.x, self.y = coordinates
+
+    @property
+    def prev_location(self):
+        return self.prev_x, self.prev_y
+
+    def update(self, policy, size: (int, int)):
+        """
+        Move the agent according to a policy.
+        :param policy: Policy that decides the change in rotation and location.
+        :param size: Dimensions of the simulation area. The agent is kept within it.
+        """
         delta_rotation, delta_location = policy.execute(self)
 
         # Apply rotation change
@@ -56,73 +73,84 @@ class Agent:
         radians_rotation = math.radians(self.rotation)
 
         # Save previous location
-        self.prev_location = self.location
-
-        # Update location
-        self.location = (round(self.location[0] + math.cos(radians_rotation) * delta_location),  # X Coordinate
-                         round(self.location[1] + math.sin(radians_rotation) * delta_location))  # Y Coordinate
+        self.prev_x = self.x
+        self.prev_y = self.y
 
-        # Keep location within simulation boundary
-        self.location = (max(0, min(self.location[0], self.simulation.size[0] - 1)),
-                         max(0, min(self.location[1], self.simulation.size[1] - 1)))
+        # Update location and keep it within simulation boundary
+        self.x = max(0, min(round(self.x + math.cos(radians_rotation) * delta_location), size[0] - 1))
+        self.y = max(0, min(round(self.y + math.sin(radians_rotation) * delta_location), size[1] - 1))
 
         # Update sensor coords
         self.vision_sensor.update()
 
     def move(self, coordinates: (int, int)):
-        self.location = coordinates
-
-    def sensor_collision_detection(self):
-
-        possible_collision_edges = []
-
-        # Get all obstacle borders that are within the radius of a sensor ray to the agent
-        for edge in self.simulation.obstacle_edges:
-            if utils.minimum_distance(edge, self.location) <= self.vision_sensor.ray_length:
-                possible_collision_edges.append(edge)
-
-        # Check if edges in range for a collision actually collide with one of the agents sensor rays
-        for edge in possible_collision_edges:
-            for sensor_index, sensor in enumerate(self.vision_sensor.sensor_coords):
-                sensor_line = (sensor, self.location)
-
-                # Check intersection with one sensor ray
-                intersection_coords = utils.line_intersection(edge, sensor_line)
+        self.x, self.y = coordinates
 
-                if intersection_coords is not None:
-
-                    # CASE: No other collision with this sensor ray was detected yet
-                    if self.vision_sensor.sensor_collisions[sensor_index] is None:
-                        self.vision_sensor.sensor_collisions[sensor_index] = intersection_coords
-                        # self.sensor_collision_distance[sensor_index] = collision_distance
-
-                    # CASE: Sensor ray already has a collision logged
-                    else:
-                        collision_distance = utils.calculate_distance(intersection_coords, self.location)
-
-                        # Distance for previous collision now needs to be calculated
-                        if self.vision_sensor.sensor_collision_distance[sensor_index] is None:
-                            prev_collision_distance = utils.calculate_distance(self.vision_sensor.sensor_collisions[sensor_index], self.location)
-                            self.vision_sensor.sensor_collision_distance[sensor_index] = prev_collision_distance
-
-                        # Add distance and new coords to arrays
-                        if self.vision_sensor.sensor_collision_distance[sensor_index] > collision_distance:
-                            self.vision_sensor.sensor_collisions[sensor_index] = intersection_coords
-                            self.vision_sensor.sensor_collision_distance[sensor_index] = collision_distance
-
-    def agent_vicinity_detection(self, detection_distance):
+        # Keep the sensor rays at the new location
+        self.vision_sensor.update()
 
+    def sensor_collision_detection(self, edge_index, ray_step: int = 1):
+        """
+        Calculate the collisions of all sensor rays with the obstacle edges.
+        :param edge_index: Spatial index of the obstacle edges (EdgeGrid).
+        :param ray_step: Only cast every n-th ray (the outermost rays are always cast). Rays that are not cast report
+                         no collision. Used to reduce the sensor fidelity under load.
+        """
+        sensor = self.vision_sensor
+
+        # Collisions are still up to date for the current pose and were cast with at least the requested fidelity
+        if sensor.valid and sensor.ray_step <= ray_step:
+            return
+        sensor.valid = True
+        sensor.ray_step = ray_step
+        sensor.reset_collisions()
+
+        x = self.x
+        y = self.y
+        ray_length = sensor.ray_length
+        sensor_x = sensor.sensor_x
+        sensor_y = sensor.sensor_y
+        collision_distance = sensor.collision_distance
+
+        ray_indices = range(sensor.num_of_rays)
+        if ray_step > 1:
+            ray_indices = sorted(set(range(0, sensor.num_of_rays, ray_step)) | {sensor.num_of_rays - 1})
+
+        # Only edges that are within the radius of a sensor ray to the agent can collide. The edge index returns the
+        # edges of nearby grid cells, the exact distance check filters them further.
+        for (ax, ay), (bx, by) in edge_index.query(x, y, ray_length):
+            if utils.point_segment_distance(x, y, ax, ay, bx, by) > ray_length:
+                continue
+
+            # Check if the edge actually collides with one of the agents sensor rays
+            for sensor_index in ray_indices:
+                ray_dx = sensor_x[sensor_index] - x
+                ray_dy = sensor_y[sensor_index] - y
+                t = utils.ray_segment_intersection(x, y, ray_dx, ray_dy, ax, ay, bx, by)
+                if t < 0:
+                    continue
+
+                # Only keep the collision closest to the agent. NaN compares False, so first hits are always stored
+                distance = t * math.hypot(ray_dx, ray_dy)
+                if not distance >= collision_distance[sensor_index]:
+                    sensor.set_collision(sensor_index, x + t * ray_dx, y + t * ray_dy, distance)
+
+    def agent_vicinity_detection(self, agents, detection_distance):
+        """
+        Find the agents within a distance.
+        :param agents: Agents to check, e.g. all agents of the simulation.
+        :param detection_distance: Maximum distance.
+        :return: Dictionary agent -> (distance, angle relative to the own rotation).
+        """
         detected_agents = {}
 
-        for agent in self.simulation.agents:
-            if agent.name != self.name:
-                distance = utils.calculate_distance(self.location, agent.location)
+        for agent in agents:
+            if agent is not self:
+                delta_x = agent.x - self.x
+                delta_y = agent.y - self.y
+                distance = math.hypot(delta_x, delta_y)
 
                 if distance <= detection_distance:
-                    # Calculate the difference in coordinates
-                    delta_x = agent.location[0] - self.location[0]
-                    delta_y = agent.location[1] - self.location[1]
-
                     # calculate relative angle to own rotation
                     relative_angle = math.degrees(math.atan2(delta_y, delta_x)) - self.rotation
 
@@ -135,39 +163,36 @@ class Agent:
 
     def get_collision_distances(self):
         """
-        Gets the distances for each sensor to the nearest collision. Also calculates distances for sensors that only
-        have one collision as this step was skipped to increase the performance in the base collision detection.
-        :return: List of distances to obstacle for each sensor
+        Gets the distances for each sensor to the nearest collision.
+        :return: Array of distances to obstacle for each sensor. Sensors without a collision hold NaN.
         """
-
-        # Calculate all sensor collision distances that were skipped in the main collision function
-        for i, sensor_collision_coords in enumerate(self.vision_sensor.sensor_collisions):
-            if sensor_collision_coords is not None and self.vision_sensor.sensor_collision_distance[i] is None:
-                collision_distance = utils.calculate_distance(sensor_collision_coords, self.location)
-                self.vision_sensor.sensor_collision_distance[i] = collision_distance
-
-        return self.vision_sensor.sensor_collision_distance
+        return self.vision_sensor.collision_distance
 
 
 class PlayerControlledAgent(Agent):
-    def __init__(self, simulation, **kwargs):
-        super().__init__(simulation=simulation, **kwargs)
-        self.name = "user_controlled_agent"
+    __slots__ = ()
 
-    def update(self, policy):  # policy is only placeholder
+    @property
+    def name(self):
+        return "user_controlled_agent"
 
+    def update(self, policy, size: (int, int)):  # policy is only placeholder
         movement = 0
         rotation = 0
 
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_w]:
-            movement += 1
-        if keys[pygame.K_s]:
-            movement -= 1
-        if keys[pygame.K_d]:
-            rotation += 1
-        if keys[pygame.K_a]:
-            rotation -= 1
+        # Without a window (headless simulation) there is no keyboard input. pygame is only used if the GUI already
+        # loaded it, so headless processes never import it.
+        pygame = sys.modules.get("pygame")
+        if pygame is not None and pygame.display.get_init():
+            keys = pygame.key.get_pressed()
+            if keys[pygame.K_w]:
+                movement += 1
+            if keys[pygame.K_s]:
+                movement -= 1
+            if keys[pygame.K_d]:
+                rotation += 1
+            if keys[pygame.K_a]:
+                rotation -= 1
 
         # Randomly change direction
         self.rotation = self.rotation + rotation * self.turning_speed
@@ -177,15 +202,12 @@ class PlayerControlledAgent(Agent):
         radians_rotation = math.radians(self.rotation)
 
         # Save previous location
-        self.prev_location = self.location
-
-        # Update location
-        self.location = (round(self.location[0] + (math.cos(radians_rotation) * self.movement_speed)*movement),  # X Coordinate
-                         round(self.location[1] + (math.sin(radians_rotation) * self.movement_speed)*movement))  # Y Coordinate
+        self.prev_x = self.x
+        self.prev_y = self.y
 
-        # Keep location within simulation boundary
-        self.location = (max(0, min(self.location[0], self.simulation.size[0] - 1)),
-                         max(0, min(self.location[1], self.simulation.size[1] - 1)))
+        # Update location and keep it within simulation boundary
+        self.x = max(0, min(round(self.x + (math.cos(radians_rotation) * self.movement_speed)*movement), size[0] - 1))
+        self.y = max(0, min(round(self.y + (math.sin(radians_rotation) * self.movement_speed)*movement), size[1] - 1))
 
         # Update sensor coords
         self.vision_sensor.update()
@@ -1,3 +1,4 @@
+import math
 import random
 from abc import ABC, abstractmethod
 from typing import Tuple, Union
@@ -36,10 +37,10 @@ class SimpleCollisionAvoidancePolicy(Policy):
     @staticmethod
     def execute(agent):
         # Turn in the opposite direction if a obstacle is detected on the sensor furthest to one side
-        if agent.vision_sensor.sensor_collisions[-1] is not None:
+        if agent.vision_sensor.has_collision(-1):
             delta_rotation = - agent.turning_speed
 
-        elif agent.vision_sensor.sensor_collisions[0] is not None:
+        elif agent.vision_sensor.has_collision(0):
             delta_rotation = agent.turning_speed
 
         # If none are detected, decide randomly
@@ -57,3 +58,73 @@ class FreezePolicy(Policy):
     @staticmethod
     def execute(agent):
         return 0, 0
+
+
+class ParameterizedPolicy(Policy):
+    """
+    Policy whose behaviour is defined by a vector of numeric parameters, e.g. for automated tuning. Unlike the other
+    policies it is used as instance: ParameterizedPolicySubclass(parameters).
+    """
+
+    # Names and default values of the parameters, in vector order
+    parameter_names: Tuple[str, ...] = ()
+    default_parameters: Tuple[float, ...] = ()
+
+    def __init__(self, parameters=None):
+        """
+        :param parameters: Parameter vector. Defaults to default_parameters.
+        """
+        parameters = self.default_parameters if parameters is None else tuple(float(p) for p in parameters)
+        if len(parameters) != len(self.parameter_names):
+            raise ValueError(f"{type(self).__name__} expects {len(self.parameter_names)} parameters "
+                             f"({', '.join(self.parameter_names)}), got {len(parameters)}")
+        self.parameters = parameters
+
+
+class ParameterizedAvoidancePolicy(ParameterizedPolicy):
+    """
+    Obstacle avoidance with tunable weights. The sensor rays are split into the first half, the second half and the
+    middle third. For each part the proximity of the obstacles is measured (0 = nothing detected, 1 = touching):
+    - The agent turns away from the closer side and additionally turns when the front is blocked.
+    - The speed is reduced when the front is blocked.
+    Turning and speed are fractions of the agent's maximum turning and movement speed.
+    """
+
+    parameter_names = ("side_turn_gain", "front_turn_gain", "random_turn", "cruise_speed", "front_brake")
+    default_parameters = (1.0, 1.0, 1.0, 1.0, 0.0)
+
+    def execute(self, agent):
+        side_turn_gain, front_turn_gain, random_turn, cruise_speed, front_brake = self.parameters
+        sensor = agent.vision_sensor
+        num_rays = sensor.num_of_rays
+        ray_length = sensor.ray_length
+
+        # Proximity of the detected obstacle per ray
+        proximities = [0.0 if math.isnan(distance) else 1 - distance / ray_length
+                       for distance in sensor.collision_distance]
+
+        half = num_rays // 2
+        first_side = sum(proximities[:half]) / half if half else 0
+        second_side = sum(proximities[num_rays - half:]) / half if half else 0
+        front = max(proximities[num_rays // 3:num_rays - num_rays // 3] or proximities or [0])
+
+        # Obstacles on the side of the first ray turn the agent in positive direction, like
+        # SimpleCollisionAvoidancePolicy does
+        side = first_side - second_side
+        turn = side_turn_gain * side + front_turn_gain * front * (1 if side >= 0 else -1)
+        turn += random_turn * random.uniform(-1, 1)
+        delta_rotation = max(-1.0, min(turn, 1.0)) * agent.turning_speed
+
+        speed = max(0.0, min(cruise_speed - front_brake * front, 1.0))
+        delta_location = speed * agent.movement_speed
+
+        return delta_rotation, delta_location
+
+
+# Policies by the names used in scenario files
+POLICIES = {
+    "random": RandomPolicy,
+    "collision_avoidance": SimpleCollisionAvoidancePolicy,
+    "freeze": FreezePolicy,
+    "parameterized_avoidance": ParameterizedAvoidancePolicy
+}
@@ -1,25 +1,128 @@
 import math
+from array import array
+from collections import OrderedDict
 
 
 class VisionSensor:
+    """
+    Ray sensor attached to an agent. All per-ray data is kept in fixed-size float arrays that are allocated once and
+    reused every tick. A ray without a collision holds NaN in its collision arrays.
+    Collision results stay valid as long as the agent does not move or rotate and no obstacle near the agent changes.
+    When the pose changes the results are reset, unless they are held on purpose (hold_results), e.g. for agents whose
+    detection is skipped under load. Held results stay until the next collision detection.
+    """
+
+    __slots__ = ("parent_agent", "num_of_rays", "ray_length", "fov", "relative_x", "relative_y",
+                 "sensor_x", "sensor_y", "collision_x", "collision_y", "collision_distance",
+                 "pose_x", "pose_y", "pose_rotation", "valid", "ray_step", "hold_results")
+
+    # Relative ray end positions only depend on the sensor configuration, so agents with equal sensors share them.
+    # Random sensor configurations are rarely shared, so only the most recently used ones are kept.
+    _relative_position_cache = OrderedDict()  # (num_of_rays, ray_length, fov) -> (relative_x, relative_y)
+    max_cached_positions = 256
+
+    # Arrays filled with NaN, used to reset the collision arrays without allocating new ones
+    _empty_buffers = {}
+
     def __init__(self, parent_agent, num_of_rays: int, ray_length: int, fov: int):
         self.parent_agent = parent_agent
         self.num_of_rays = max(1, num_of_rays)
         self.ray_length = max(0, ray_length)
         self.fov = max(0, min(fov, 360))
-        self.relative_sensor_positions = self.calculate_relative_sensor_positions()
+        self.relative_x, self.relative_y = self.calculate_relative_sensor_positions()
+
+        self.sensor_x = array("d", bytes(8 * self.num_of_rays))
+        self.sensor_y = array("d", bytes(8 * self.num_of_rays))
+        self.collision_x = array("d", VisionSensor._get_empty_buffer(self.num_of_rays))
+        self.collision_y = array("d", self.collision_x)
+        self.collision_distance = array("d", self.collision_x)
 
-        self.sensor_coords = self.calculate_sensor_pos()
-        self.sensor_collisions = [None for _ in range(num_of_rays)]
-        self.sensor_collision_distance = [None for _ in range(num_of_rays)]
+        # Agent pose the sensor positions were calculated for and whether the collisions are computed for that pose
+        self.pose_x = None
+        self.pose_y = None
+        self.pose_rotation = None
+        self.valid = False
+        self.ray_step = 1  # Every n-th ray was cast for the current results
+        self.hold_results = False  # Keep the last results after pose changes until the next detection
+
+        self.calculate_sensor_pos()
+
+    @staticmethod
+    def _get_empty_buffer(size: int):
+        empty_buffer = VisionSensor._empty_buffers.get(size)
+        if empty_buffer is None:
+            empty_buffer = array("d", [math.nan]) * size
+            VisionSensor._empty_buffers[size] = empty_buffer
+        return empty_buffer
 
     def update(self):
-        self.sensor_coords = self.calculate_sensor_pos()
-        self.sensor_collisions = [None for _ in range(self.num_of_rays)]
-        self.sensor_collision_distance = [None for _ in range(self.num_of_rays)]
+        agent = self.parent_agent
+
+        # Keep the cached collisions if the agent did not move or rotate
+        if self.pose_x == agent.x and self.pose_y == agent.y and self.pose_rotation == agent.rotation:
+            return
+
+        self.calculate_sensor_pos()
+        self.valid = False
+        if not self.hold_results:
+            self.reset_collisions()
+
+    def invalidate(self):
+        """
+        Discard the collision results, e.g. because an obstacle near the agent changed. The collisions are calculated
+        again on the next collision detection.
+        """
+        self.reset_collisions()
+        self.valid = False
+
+    def reset_collisions(self):
+        """
+        Mark all rays as collision free. The arrays are overwritten in place.
+        """
+        empty_buffer = VisionSensor._get_empty_buffer(self.num_of_rays)
+        self.collision_x[:] = empty_buffer
+        self.collision_y[:] = empty_buffer
+        self.collision_distance[:] = empty_buffer
+
+    def has_collision(self, index: int) -> bool:
+        """
+        :param index: Index of the sensor ray. Negative indices are allowed.
+        :return: True if the ray currently detects an obstacle.
+        """
+        return not math.isnan(self.collision_distance[index])
+
+    def set_collision(self, index: int, x: float, y: float, distance: float):
+        self.collision_x[index] = x
+        self.collision_y[index] = y
+        self.collision_distance[index] = distance
+
+    def collision_point(self, index: int):
+        """
+        :param index: Index of the sensor ray.
+        :return: (x, y) coordinates of the ray collision or None if the ray does not collide.
+        """
+        if math.isnan(self.collision_distance[index]):
+            return None
+        return self.collision_x[index], self.collision_y[index]
+
+    @property
+    def sensor_coords(self):
+        """
+        End points of all sensor rays as a list of (x, y) tuples. Convenience accessor, the update loop works on the
+        arrays directly.
+        """
+        return list(zip(self.sensor_x, self.sensor_y))
 
     def calculate_relative_sensor_positions(self):
-        relative_sensor_positions = []
+        cache_key = (self.num_of_rays, self.ray_length, self.fov)
+        cache = VisionSensor._relative_position_cache
+        cached_positions = cache.get(cache_key)
+        if cached_positions is not None:
+            cache.move_to_end(cache_key)
+            return cached_positions
+
+        relative_x = array("d")
+        relative_y = array("d")
         start_angle_rad = -math.radians(self.fov / 2)  # Corrected start angle based on fov
 
         if self.num_of_rays > 1:
@@ -35,30 +138,29 @@ class VisionSensor:
 
             adjacent = math.cos(start_angle_rad + step_angle_rad*i) * self.ray_length  # Ray length = Hypothenuse
             opposite = math.sin(start_angle_rad + step_angle_rad*i) * self.ray_length  # Ray length = Hypothenuse
-            pos = (round(adjacent), round(opposite))
-            relative_sensor_positions.append(pos)
+            relative_x.append(round(adjacent))
+            relative_y.append(round(opposite))
 
-        return relative_sensor_positions
+        cache[cache_key] = (relative_x, relative_y)
+        if len(cache) > VisionSensor.max_cached_positions:
+            cache.popitem(last=False)
+        return relative_x, relative_y
 
     def calculate_sensor_pos(self):
-        # Convert angle to radians
+        self.pose_x = self.parent_agent.x
+        self.pose_y = self.parent_agent.y
+        self.pose_rotation = self.parent_agent.rotation
+
+        # Build the rotation matrix entries for the current agent rotation
         angle_rad = math.radians(self.parent_agent.rotation)
-        # Define the rotation matrix
-        rotation_matrix = [
-            [math.cos(angle_rad), -math.sin(angle_rad)],
-            [math.sin(angle_rad), math.cos(angle_rad)]
-        ]
-        # Apply the rotation matrix to each point
-        rotated_positions = []
-        for point in self.relative_sensor_positions:
-            rotated_point = [
-                point[0] * rotation_matrix[0][0] + point[1] * rotation_matrix[0][1],
-                point[0] * rotation_matrix[1][0] + point[1] * rotation_matrix[1][1]
-            ]
-
-            # Add current coords
-            rotated_point = (rotated_point[0] + self.parent_agent.location[0], rotated_point[1] + self.parent_agent.location[1])
-
-            rotated_positions.append(rotated_point)
-
-        return rotated_positions
+        cos_angle = math.cos(angle_rad)
+        sin_angle = math.sin(angle_rad)
+        agent_x = self.parent_agent.x
+        agent_y = self.parent_agent.y
+
+        # Rotate every relative position and add the current coords. Results are written into the existing arrays.
+        sensor_x = self.sensor_x
+        sensor_y = self.sensor_y
+        for i, (relative_x, relative_y) in enumerate(zip(self.relative_x, self.relative_y)):
+            sensor_x[i] = relative_x * cos_angle - relative_y * sin_angle + agent_x
+            sensor_y[i] = relative_x * sin_angle + relative_y * cos_angle + agent_y
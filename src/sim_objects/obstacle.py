@@ -1,13 +1,27 @@
-import pygame
+from typing import NamedTuple
 
 from src.colors import *
 
 
-class Obstacle(pygame.sprite.Sprite):
-    def __init__(self, position: (int, int), width: int, height: int):
-        super().__init__()
+class ObstacleRect(NamedTuple):
+    """
+    Lightweight replacement for pygame.Rect, so obstacles can be used without importing pygame. Can be passed to
+    pygame drawing functions directly.
+    """
+    x: int
+    y: int
+    width: int
+    height: int
 
-        self.image = pygame.Surface([width, height])
-        self.image.fill(grey)
-        self.rect = self.image.get_rect()
-        self.rect.topleft = position
+    def collidepoint(self, x, y) -> bool:
+        return self.x <= x < self.x + self.width and self.y <= y < self.y + self.height
+
+
+class Obstacle:
+    __slots__ = ("rect", "obstacle_id")
+
+    color = grey
+
+    def __init__(self, position: (int, int), width: int, height: int, obstacle_id: int = None):
+        self.rect = ObstacleRect(position[0], position[1], width, height)
+        self.obstacle_id = obstacle_id  # Id of the obstacle in the world of the simulation
@@ -1,29 +1,51 @@
-import pygame
+import math
 import time
 
 from src.colors import *
 from src.sim_objects.agent_policy import *
 from src.sim_objects.agent import Agent, PlayerControlledAgent
-from src.sim_objects.obstacle import Obstacle
+from src.sim_objects.obstacle import Obstacle, ObstacleRect
+from src.world import World, build_random_world
+from src.scenario import Scenario
+from src.frame_governor import FrameBudgetGovernor
 from src import utils
-from src.gui_objects.agent_camera import AgentCameraSurface
+
+# pygame and the gui objects are imported inside the functions that draw or handle input, so headless simulations
+# never load them
 
 
 def run_simulation(simulation_dimensions: Tuple[int, int], simulation_fps: int = 30, number_of_agents: int = 20,
-                   player_controlled_agent: bool = False):
+                   player_controlled_agent: bool = False, scenario_path: str = None, world_cache_dir: str = None,
+                   window_dimensions: Tuple[int, int] = None, adaptive_sensor_lod: bool = False,
+                   analytics_path: str = None, state_stream_address=None):
     """
     Starts a new simulation and runs the main game loop. Parameters for the simulation are defined here.
     :param simulation_dimensions: Dimensions of the simulation area defined as a tuple (x, y).
     :param simulation_fps: Target frames per second of the simulation.
     :param number_of_agents: Number of agents that get spawned into the simulation.
     :param player_controlled_agent: Define if a user controllable agent should be spawned.
+    :param scenario_path: Path of a scenario file. If set, dimensions, agents and the player controlled agent are
+                          taken from the scenario instead.
+    :param world_cache_dir: Directory for caching compiled worlds.
+    :param window_dimensions: Size of the window. Defaults to the simulation dimensions. Larger worlds can be explored
+                              by panning and zooming the view.
+    :param adaptive_sensor_lod: Reduce the sensor fidelity of background agents when a frame takes longer than the
+                                target frame time.
+    :param analytics_path: If set, statistics of the run are collected and saved to this file when the window is
+                           closed.
+    :param state_stream_address: (host, port) tuple or Unix socket path for streaming the state to remote observers.
     """
+    import pygame
+
+    scenario = Scenario.load(scenario_path) if scenario_path is not None else None
+    if scenario is not None:
+        simulation_dimensions = scenario.size
 
     # Initialize pygame and set up the window
     pygame.init()
     pygame.font.init()
     pygame.display.set_caption("Simulation")
-    screen = pygame.display.set_mode(simulation_dimensions)
+    screen = pygame.display.set_mode(window_dimensions or simulation_dimensions)
 
     # Create game loop variables
     done = False
@@ -31,8 +53,16 @@ def run_simulation(simulation_dimensions: Tuple[int, int], simulation_fps: int =
     delta_time_last_frame = 1
 
     # Create simulation instance
-    simulation = Simulation(size=simulation_dimensions, number_of_agents=number_of_agents,
-                            player_controlled_agent=player_controlled_agent)
+    frame_budget = 1 / simulation_fps if adaptive_sensor_lod else None
+    if scenario is not None:
+        simulation = Simulation.from_scenario(scenario, world_cache_dir=world_cache_dir, frame_budget=frame_budget,
+                                              analytics=analytics_path is not None,
+                                              state_stream_address=state_stream_address)
+    else:
+        simulation = Simulation(size=simulation_dimensions, number_of_agents=number_of_agents,
+                                player_controlled_agent=player_controlled_agent, frame_budget=frame_budget,
+                                analytics=analytics_path is not None,
+                                state_stream_address=state_stream_address)
 
     """ MAIN GAME LOOP """
 
@@ -48,6 +78,61 @@ def run_simulation(simulation_dimensions: Tuple[int, int], simulation_fps: int =
         # Tick game and save time this frame took to compute
         delta_time_last_frame = clock.tick(simulation_fps) / 1000
 
+    if analytics_path is not None:
+        simulation.analytics.dump(analytics_path)
+    if simulation.state_publisher is not None:
+        simulation.state_publisher.close()
+
+
+def export_simulation(output: str, num_steps: int, frame_size: Tuple[int, int] = (1280, 720),
+                      simulation_dimensions: Tuple[int, int] = (1280, 720), number_of_agents: int = 20,
+                      scenario_path: str = None, world_cache_dir: str = None, raw_video: bool = False,
+                      frame_interval: int = 1, simulation_fps: int = 30, num_workers: int = 2,
+                      show_debug_info: bool = False, simulation=None):
+    """
+    Runs a simulation without a window and exports the rendered frames. Frames are drawn into an offscreen surface of
+    any size, the whole world is fit into the frame. Encoding and writing happens in worker processes (see
+    frame_export.py), so only the rendering runs in the simulation process.
+    :param output: Directory for PNG frames or file path of the raw video stream.
+    :param num_steps: Number of simulation steps.
+    :param frame_size: Size of the exported frames.
+    :param simulation_dimensions: Dimensions of the simulation area defined as a tuple (x, y).
+    :param number_of_agents: Number of agents that get spawned into the simulation.
+    :param scenario_path: Path of a scenario file. If set, dimensions and agents are taken from the scenario instead.
+    :param world_cache_dir: Directory for caching compiled worlds.
+    :param raw_video: Write one raw RGB video stream instead of numbered PNG frames.
+    :param frame_interval: Export every n-th simulation step.
+    :param simulation_fps: Frame rate the video is meant to be played at. Used for the FPS debug info.
+    :param num_workers: Number of PNG encoding processes.
+    :param show_debug_info: Draw the debug values into the frames.
+    :param simulation: Existing simulation to export instead of creating a new one.
+    :return: The simulation after the last step.
+    """
+    import pygame
+    from src.frame_export import FrameExporter
+    from src.gui_objects.viewport import Viewport
+
+    if simulation is None:
+        if scenario_path is not None:
+            simulation = Simulation.from_scenario(scenario_path, world_cache_dir=world_cache_dir)
+        else:
+            simulation = Simulation(size=simulation_dimensions, number_of_agents=number_of_agents)
+
+    # Offscreen surface, no display is needed
+    frame = pygame.Surface(frame_size)
+    simulation.viewport = Viewport(frame_size, simulation.size)
+    simulation.viewport.zoom_to_fit()
+    simulation.show_control_hotkeys = False
+
+    with FrameExporter(output, frame_size, raw_video=raw_video, num_workers=num_workers) as exporter:
+        for step in range(num_steps):
+            simulation.update()
+            if step % frame_interval == 0:
+                simulation.display_frame(frame, 1 / simulation_fps, show_debug_info=show_debug_info)
+                exporter.submit(frame)
+
+    return simulation
+
 
 class Simulation:
     """
@@ -57,23 +142,50 @@ class Simulation:
     # Figures
     entity_polygon = [(0, 0), (-10, -5), (-8, 0), (-10, +5)]
 
-    def __init__(self, size: Tuple[int, int], number_of_agents: int, player_controlled_agent: bool = False):
+    def __init__(self, size: Tuple[int, int], number_of_agents: int, player_controlled_agent: bool = False,
+                 spawn_separation: float = 0, seed: int = None, world: World = None, world_cache_dir: str = None,
+                 agent_collisions: bool = False, agent_radius: float = 6, frame_budget: float = None,
+                 analytics: bool = False, state_stream_address=None):
         """
         Initialize the simulation.
         :param size: Dimensions of the simulation area defined as a tuple (x, y).
         :param number_of_agents: Number of agents that get spawned into the simulation.
         :param player_controlled_agent: Define if a user controllable agent should be spawned.
+        :param spawn_separation: Minimum distance between the spawn locations of agents. 0 disables the constraint.
+        :param seed: Seed for the random world and agent generation. Makes the simulation reproducible.
+        :param world: Prebuilt world (obstacles, edges, indices, spawn table). If None, a random world is generated.
+                      Obstacle changes at runtime modify this world in place.
+        :param world_cache_dir: Directory for caching generated worlds across process starts. Only used together with
+                                a seed, as worlds without a seed are never generated twice.
+        :param agent_collisions: Enable collisions between agents. Overlapping agents are pushed apart every step.
+        :param agent_radius: Radius of the bounding circle of an agent, used for agent collisions.
+        :param frame_budget: Time budget for simulating and drawing one frame in seconds. If set, sensor updates of
+                             background agents are reduced while frames take longer than the budget.
+        :param analytics: Collect occupancy, collision, sensor and travel statistics every step (see analytics.py).
+        :param state_stream_address: (host, port) tuple or Unix socket path. If set, the state of every step is
+                                     streamed to connected observers (see state_stream.py).
         """
         self.size = size
 
+        if seed is not None:
+            random.seed(seed)
+
         # Simulation element groups
         self.agents = []
-        self.obstacles = pygame.sprite.Group()
+        self.obstacles = []
         self.selected_agent = None
 
-        # Initialize fonts
-        self.debug_font = pygame.font.SysFont('Arial', 14)
-        self.entity_info_font = pygame.font.SysFont("Arial", 12)
+        # Fonts and the agent renderer are initialized on the first drawn frame
+        self.debug_font = None
+        self.entity_info_font = None
+        self.debug_text = None
+        self.entity_info_text = None
+        self.agent_renderer = None
+        self.viewport = None
+
+        # Grid over the agent positions of the current step and the sensor ray length per agent. Built on first use.
+        self.agent_grid = None
+        self.agent_ray_lengths = None
 
         # Display states
         self.show_agent_debug_info = False
@@ -81,60 +193,146 @@ class Simulation:
         self.show_control_hotkeys = True
         self.show_agent_camera = False
 
+        # Calculate sensor collisions every step, not only while they are shown. Needed for sensor based policies.
+        self.compute_sensors = False
+        self.sensors_computed = False  # Sensors were calculated in the last step
+
+        # Agent-agent collision handling. numpy is only imported when it is used.
+        self.agent_separation = None
+        if agent_collisions:
+            from src.agent_separation import AgentSeparation
+            self.agent_separation = AgentSeparation(radius=agent_radius)
+
+        # Aggregated statistics of the run. numpy is only imported when it is used.
+        self.analytics = None
+        if analytics:
+            from src.analytics import SimulationAnalytics
+            self.analytics = SimulationAnalytics(self.size)
+
+        # Live state stream for remote observers
+        self.state_publisher = None
+        if state_stream_address is not None:
+            from src.state_stream import StatePublisher
+            self.state_publisher = StatePublisher(state_stream_address)
+
         # Timers
         self.timer_agent_updates = 0
         self.timer_collision_handling = 0
+        self.timer_agent_separation = 0
+        self.timer_sensor_updates = 0
+        self.timer_analytics = 0
+
+        # Adaptive sensor level of detail to keep every frame within the frame budget
+        self.frame_governor = FrameBudgetGovernor(frame_budget) if frame_budget is not None else None
+        self.foreground_agents = set()  # Agents that always get full sensor fidelity, e.g. the ones on screen
         self.timer_draw_frame = 0
 
-        # TODO TEMPORARY Add random obstacles
-        for _ in range(5):
-            self.add_obstacle(position=(random.randint(0, self.size[0]-300), random.randint(0, self.size[1]-300)),
-                              width=random.randint(50, 500), height=random.randint(50, 500))
+        # TODO TEMPORARY Generate a world with random obstacles and a border
+        if world is None:
+            world = World.load_or_build(cache_key=("random_world", tuple(self.size), seed, 5, 50),
+                                        build_function=lambda: build_random_world(self.size, seed=seed),
+                                        cache_dir=world_cache_dir if seed is not None else None)
 
-        # Add border obstacles
-        self.add_border(thickness=50)
+        # Take over the precomputed geometry of the world
+        self.world = world
+        self.obstacles = [Obstacle((rect.x, rect.y), rect.width, rect.height, obstacle_id=obstacle_id)
+                          for obstacle_id, rect in world.obstacle_rects.items()]
+        self.obstacles_by_id = {obstacle.obstacle_id: obstacle for obstacle in self.obstacles}
+        self.edge_index = world.edge_index
 
-        # Calculate obstacle edges
-        self.obstacle_edges = self.get_obstacle_edges()
+        # Place all agents in one batch
+        spawn_locations = self.spawn_sampler.sample(number_of_agents + int(player_controlled_agent),
+                                                    min_separation=spawn_separation)
 
         # Add agents to simulation
-        for _ in range(number_of_agents):
+        for spawn_location in spawn_locations[:number_of_agents]:
             # TODO: TEMP test with randowm agent parameter values
             rand_speed = random.randint(1, 5)
             rand_fov = random.randint(30, 120)
             rand_sensor_length = random.randint(50, 150)
             rand_num_sensors = random.randint(3, 20)
             new_agent = Agent(simulation=self, movement_speed=rand_speed, vision_sensors_fov=rand_fov,
-                              vision_sensors_length=rand_sensor_length, num_vision_sensors=rand_num_sensors)
+                              vision_sensors_length=rand_sensor_length, num_vision_sensors=rand_num_sensors,
+                              location=spawn_location)
             new_agent.color = (280 - rand_speed * 25, 280 - rand_speed * 25, 255)
             self.agents.append(new_agent)
 
         # Add player controlled agent
+        self.user_controlled_agent = None
         if player_controlled_agent:
             self.user_controlled_agent = PlayerControlledAgent(self, movement_speed=3, turning_speed=2, color=green,
                                                                vision_sensors_fov=70, vision_sensors_length=500,
-                                                               num_vision_sensors=99)  # Add more sensors for user agent
+                                                               num_vision_sensors=99,  # Add more sensors for user agent
+                                                               location=spawn_locations[-1])
             self.agents.append(self.user_controlled_agent)
 
-        # Add agent vision pov surface
+        # Agent vision pov surface. Created on the first drawn frame.
         self.agent_camera_dimensions = (320, 180)
-        self.agent_camera_surface = AgentCameraSurface(size=self.agent_camera_dimensions,
-                                                       agent=self.user_controlled_agent)
+        self.agent_camera_surface = None
 
         # TODO TEST
         self.freeze_agents = False
 
+    @property
+    def obstacle_edges(self):
+        return self.world.obstacle_edges
+
+    @property
+    def spawn_sampler(self):
+        return self.world.spawn_sampler
+
+    @classmethod
+    def from_scenario(cls, scenario, world_cache_dir: str = None, frame_budget: float = None,
+                      analytics: bool = False, state_stream_address=None):
+        """
+        Create a simulation from a scenario. The scenario world is compiled (or loaded from cache) and all agent
+        populations of the scenario are spawned.
+        :param scenario: Scenario instance or path of a scenario file.
+        :param world_cache_dir: Directory for caching the compiled world.
+        :param frame_budget: Frame time budget for adaptive sensor fidelity, see Simulation.
+        :param analytics: Collect aggregated statistics of the run, see Simulation.
+        :param state_stream_address: Address for streaming the state to remote observers, see Simulation.
+        :return: Simulation instance.
+        """
+        if isinstance(scenario, str):
+            scenario = Scenario.load(scenario)
+
+        # Agent collisions are enabled with true or a dict of settings, false or a missing key disables them
+        agent_collisions = scenario.definition.get("agent_collisions", False)
+        agent_collision_settings = agent_collisions if isinstance(agent_collisions, dict) else {}
+        simulation = cls(size=scenario.size, number_of_agents=0,
+                         player_controlled_agent=scenario.player_controlled_agent, seed=scenario.seed,
+                         world=scenario.compile(cache_dir=world_cache_dir),
+                         agent_collisions=bool(agent_collisions) or isinstance(agent_collisions, dict),
+                         agent_radius=agent_collision_settings.get("radius", 6), frame_budget=frame_budget,
+                         analytics=analytics, state_stream_address=state_stream_address)
+        scenario.spawn_agents(simulation)
+
+        # Scenario agents can use sensor based policies
+        simulation.compute_sensors = scenario.definition.get("compute_sensors", True)
+
+        return simulation
+
     def process_events(self):
         """
         Process input events by the player
         :return State of simulation. True = Simulation ended.
         """
+        import pygame
+
+        if self.viewport is not None:
+            self.viewport.process_keys()
+
         for event in pygame.event.get():
 
             # CASE: Game closed
             if event.type == pygame.QUIT:
                 return True
 
+            # CASE: Pan or zoom of the view
+            elif self.viewport is not None and self.viewport.process_event(event):
+                continue
+
             elif event.type == pygame.KEYDOWN:
                 # CASE: Toggle agent debug info
                 if event.key == pygame.K_t:
@@ -148,7 +346,7 @@ class Simulation:
                 if event.key == pygame.K_f:
                     self.freeze_agents = False if self.freeze_agents else True
 
-            elif event.type == pygame.MOUSEBUTTONDOWN:
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 self._on_mouseclick()
 
         return False
@@ -168,21 +366,37 @@ class Simulation:
         else:
             self.show_agent_camera = False
 
-        # Step agent movements
+        if self.frame_governor is not None:
+            self.frame_governor.start_tick()
+
+        # Agents move in this step, the position grid is rebuilt on its next use
+        self.agent_grid = None
+
+        # Step agent movements. Agents with an own policy keep it unless all agents are frozen.
         timer_start = time.time()
         for agent in self.agents:
-            agent.update(policy=use_policy)
+            if agent.policy is not None and not self.freeze_agents:
+                agent.update(policy=agent.policy, size=self.size)
+            else:
+                agent.update(policy=use_policy, size=self.size)
         self.timer_agent_updates = time.time() - timer_start
 
         """Collision detection"""
 
         timer_start = time.time()
-        # Iterate over all agents and obstacles
-        for agent in self.agents:
-            for obstacle in self.obstacles:
+        # Iterate over all agents and the obstacles in the same cell of the obstacle index
+        obstacle_index = self.world.obstacle_index
+        collided_agents = []
+        collided_obstacles = []
+        for agent_index, agent in enumerate(self.agents):
+            for obstacle_id in obstacle_index.query_point(agent.x, agent.y):
+                obstacle = self.obstacles_by_id[obstacle_id]
 
                 # Check collision of agent with environment
-                if obstacle.rect.collidepoint(agent.location[0], agent.location[1]):
+                if obstacle.rect.collidepoint(agent.x, agent.y):
+                    collided_agents.append(agent_index)
+                    collided_obstacles.append(obstacle_id)
+
                     # If collision is detected, calculate collision coords and move agent to them
                     agent_travel_line = (agent.prev_location, agent.location)
                     collision_coordinates = self.calculate_collision_point(agent_travel_line, obstacle)
@@ -190,12 +404,61 @@ class Simulation:
                     if collision_coordinates is not None:
                         agent.move(collision_coordinates)
 
+        # Push overlapping agents apart
+        if self.agent_separation is not None:
+            separation_timer_start = time.time()
+            self.agent_separation.resolve(self)
+            self.timer_agent_separation = time.time() - separation_timer_start
+
+        self.timer_collision_handling = time.time() - timer_start
+
         # Check collisions of agent sensors with environment
-        if self.show_agent_sensors:  # TODO for debug reasons only calculate collisions if shown on screen
+        timer_start = time.time()
+        # Sensors are only calculated while they are shown or needed by sensor based policies
+        if self.show_agent_sensors or self.compute_sensors:
+            edge_index = self.world.edge_index
+            governor = self.frame_governor
+            if governor is None:
+                for agent in self.agents:
+                    agent.sensor_collision_detection(edge_index)
+            else:
+                # Reduced sensor fidelity for background agents, depending on the load
+                foreground_agents = self.foreground_agents
+                degraded = governor.level > 0
+                for agent_index, agent in enumerate(self.agents):
+                    foreground = agent in foreground_agents
+                    ray_step = governor.sensor_update(agent_index, foreground)
+                    if ray_step:
+                        agent.sensor_collision_detection(edge_index, ray_step=ray_step)
+
+                    # Background agents are skipped on purpose while the fidelity is reduced. They keep their last
+                    # results when they move until their next update.
+                    agent.vision_sensor.hold_results = degraded and not foreground
+            self.sensors_computed = True
+
+        elif self.sensors_computed:
+            # Sensors were just turned off. Release held results, so no outdated collisions are left behind.
             for agent in self.agents:
-                agent.sensor_collision_detection()
+                sensor = agent.vision_sensor
+                sensor.hold_results = False
+                if not sensor.valid:
+                    sensor.reset_collisions()
+            self.sensors_computed = False
+        self.timer_sensor_updates = time.time() - timer_start
 
-        self.timer_collision_handling = time.time() - timer_start
+        if self.frame_governor is not None:
+            self.frame_governor.record_phase("agents", self.timer_agent_updates)
+            self.frame_governor.record_phase("collisions", self.timer_collision_handling)
+            self.frame_governor.record_phase("sensors", self.timer_sensor_updates)
+
+        if self.analytics is not None:
+            timer_start = time.time()
+            self.analytics.update(self, collided_agents, collided_obstacles)
+            self.timer_analytics = time.time() - timer_start
+
+        # Send the new state to remote observers
+        if self.state_publisher is not None:
+            self.state_publisher.publish(self)
 
 
     def display_frame(self, screen, delta_time_last_frame, show_debug_info=True):
@@ -205,93 +468,206 @@ class Simulation:
         :param delta_time_last_frame: time since last frame draw. used to display fps in debug infos
         :param show_debug_info: show debug values at top left of screen
         """
+        import pygame
+
         timer_start = time.time()
 
+        # Initialize fonts and the agent renderer on first use
+        if self.debug_font is None:
+            from src.gui_objects.agent_renderer import AgentRenderer
+            from src.gui_objects.text_cache import TextCache
+
+            pygame.font.init()
+            self.debug_font = pygame.font.SysFont('Arial', 14)
+            self.entity_info_font = pygame.font.SysFont("Arial", 12)
+            self.debug_text = TextCache(self.debug_font)
+            self.entity_info_text = TextCache(self.entity_info_font, antialias=False)
+            self.agent_renderer = AgentRenderer(Simulation.entity_polygon)
+
+        # Create the view on first use. Only the visible part of the world is drawn.
+        if self.viewport is None:
+            from src.gui_objects.viewport import Viewport
+            self.viewport = Viewport(screen.get_size(), self.size)
+        viewport = self.viewport
+        offset, scale = viewport.get_transform()
+
         # Reset screen
         screen.fill(black)
 
-        # Display obstacles
-        self.obstacles.draw(screen)
-
-        # Display agents
-        for agent in self.agents:
-
-            # Draw entity info
-            if self.show_agent_debug_info:
-                pygame.draw.circle(screen, red, (agent.location[0], agent.location[1]), 2, 2)
+        # Display obstacles. The query is clamped to the world, so zooming out does not scan empty grid cells.
+        shows_whole_world = viewport.shows_whole_world()
+        if shows_whole_world:
+            visible_obstacles = self.obstacles
+        else:
+            view_x0, view_y0, view_x1, view_y1 = viewport.visible_rect()
+            obstacle_ids = self.world.obstacle_index.query_rect(max(view_x0, 0), max(view_y0, 0),
+                                                                min(view_x1, self.size[0]),
+                                                                min(view_y1, self.size[1]))
+            visible_obstacles = [self.obstacles_by_id[obstacle_id] for obstacle_id in obstacle_ids]
+        for obstacle in visible_obstacles:
+            rect = obstacle.rect
+            screen_x0 = math.floor(rect.x * scale + offset[0])
+            screen_y0 = math.floor(rect.y * scale + offset[1])
+            screen_x1 = math.floor((rect.x + rect.width) * scale + offset[0])
+            screen_y1 = math.floor((rect.y + rect.height) * scale + offset[1])
+            pygame.draw.rect(screen, obstacle.color, (screen_x0, screen_y0, screen_x1 - screen_x0,
+                                                      screen_y1 - screen_y0))
+
+        # Zoomed out far: Show agents as a density map
+        if viewport.show_density:
+            xs, ys = self._get_agent_positions()
+            viewport.draw_density(screen, xs, ys, color=(155, 155, 255))
+            visible_agents = [self.selected_agent] if self.selected_agent is not None else []
 
-                text_surface = self.entity_info_font.render(f"({agent.location[0]},{agent.location[1]}) {agent.rotation}°",
-                                                            False, white)
-                screen.blit(text_surface, (agent.location[0] + 5, agent.location[1] - 15))
+        else:
+            # Agent shapes are drawn up to 10 pixels around their location, sensors can reach in from further away
+            visible_agents = self._get_agents_in_view(margin=12 / scale)
 
-            # Draw sensors
+            # Display sensors
             if self.show_agent_sensors:
-                for i, sensor in enumerate(agent.vision_sensor.sensor_coords):
-                    if agent.vision_sensor.sensor_collisions[i] is not None:
-                        pygame.draw.line(screen, red, start_pos=agent.location, end_pos=agent.vision_sensor.sensor_collisions[i])
-                        pygame.draw.circle(screen, red, agent.vision_sensor.sensor_collisions[i], 2, 2)
-                    else:
-                        pygame.draw.line(screen, green, start_pos=agent.location, end_pos=sensor)
-
-            # Rotate entity polygon to entities rotation and add its current location
-            entity_polygon = utils.rotate_polygon(Simulation.entity_polygon, agent.rotation)
-            for i, coords in enumerate(entity_polygon):
-                entity_polygon[i] = (coords[0] + agent.location[0], coords[1] + agent.location[1])
-
-            # Determine agent color
-            if self.selected_agent == agent:
-                color = blue
-            else:
-                color = agent.color
+                max_ray_length = max((agent.vision_sensor.ray_length for agent in visible_agents), default=0)
+                sensor_agents = self._get_agents_in_view(margin=max(12 / scale, max_ray_length))
+                self.agent_renderer.draw_sensors(screen, sensor_agents, offset=offset, scale=scale)
 
-            # Draw entity polygon
-            pygame.draw.polygon(screen, color, entity_polygon)
+        # Agents on screen get full sensor fidelity. If the whole world is shown, only selected and user agents do.
+        if self.frame_governor is not None:
+            self.foreground_agents = set() if shows_whole_world else set(visible_agents)
+            self.foreground_agents.update(agent for agent in (self.selected_agent, self.user_controlled_agent)
+                                          if agent is not None)
+
+        # Display agents
+        self.agent_renderer.draw_agents(screen, visible_agents, selected_agent=self.selected_agent, offset=offset,
+                                        scale=scale)
+
+        # Display entity info
+        if self.show_agent_debug_info:
+            self.agent_renderer.draw_location_markers(screen, visible_agents, offset=offset, scale=scale)
+            # Composed from cached glyphs, as the values change every step for moving agents
+            label_blits = self.entity_info_text.label_blits
+            blit_sequence = []
+            for agent in visible_agents:
+                blit_sequence += label_blits((agent.x * scale + offset[0] + 5, agent.y * scale + offset[1] - 15),
+                                             ("(", agent.x, ",", agent.y, ") ", agent.rotation, "°"), white)
+            screen.blits(blit_sequence, doreturn=False)
 
         # Display simulation infos
         if show_debug_info:
             # FPS
-            text_surface = self.debug_font.render(f"FPS: {round(1 / delta_time_last_frame)}", True, white)
-            screen.blit(text_surface, (2, 0))
+            debug_text = self.debug_text
+            debug_text.draw_number_label(screen, (2, 0), "FPS: ", round(1 / delta_time_last_frame), color=white)
             # Number of entities
-            text_surface = self.debug_font.render(f"Num Entities: {len(self.agents)}", True, white)
-            screen.blit(text_surface, (2, 14))
+            debug_text.draw_number_label(screen, (2, 14), "Num Entities: ", len(self.agents), color=white)
             # Timers
-            text_surface = self.debug_font.render(f"Agent Updates: {round(self.timer_agent_updates * 1000)}ms", True, white)
-            screen.blit(text_surface, (140, 0))
-            text_surface = self.debug_font.render(f"Collision Handling: {round(self.timer_collision_handling * 1000)}ms", True, white)
-            screen.blit(text_surface, (140, 14))
-            text_surface = self.debug_font.render(f"Draw Time: {round(self.timer_draw_frame * 1000)}ms", True, white)
-            screen.blit(text_surface, (140, 28))
+            debug_text.draw_number_label(screen, (140, 0), "Agent Updates: ", round(self.timer_agent_updates * 1000),
+                                         "ms", color=white)
+            debug_text.draw_number_label(screen, (140, 14), "Collision Handling: ",
+                                         round(self.timer_collision_handling * 1000), "ms", color=white)
+            debug_text.draw_number_label(screen, (140, 28), "Draw Time: ", round(self.timer_draw_frame * 1000), "ms",
+                                         color=white)
+            if self.agent_separation is not None:
+                debug_text.draw_number_label(screen, (140, 42), "Agent Separation: ",
+                                             round(self.timer_agent_separation * 1000), "ms", color=white)
+                debug_text.draw_number_label(screen, (320, 42), "Overlaps: ", self.agent_separation.num_overlaps,
+                                             color=white)
+            debug_text.draw_number_label(screen, (320, 0), "Sensor Updates: ", round(self.timer_sensor_updates * 1000),
+                                         "ms", color=white)
+            if self.frame_governor is not None:
+                debug_text.draw_number_label(screen, (320, 14), "Sensor LOD Level: ", self.frame_governor.level,
+                                             color=white)
+                if not self.frame_governor.budget_reachable:
+                    screen.blit(debug_text.static_label("Frame budget unreachable without sensors", red), (320, 28))
 
         # Display hotkey infos
+        screen_width, screen_height = screen.get_size()
         if self.show_control_hotkeys:
-            text_surface = self.debug_font.render("(T) Toggle Agent Info", True, blue)
-            screen.blit(text_surface, (2, self.size[1] - 18))
-
-            text_surface = self.debug_font.render("(R) Toggle Agent Sensors", True, blue)
-            screen.blit(text_surface, (2, self.size[1] - 34))
-
-            text_surface = self.debug_font.render("(F) Toggle Agent Freeze", True, blue)
-            screen.blit(text_surface, (2, self.size[1] - 52))
+            screen.blit(self.debug_text.static_label("(T) Toggle Agent Info", blue), (2, screen_height - 18))
+            screen.blit(self.debug_text.static_label("(R) Toggle Agent Sensors", blue), (2, screen_height - 34))
+            screen.blit(self.debug_text.static_label("(F) Toggle Agent Freeze", blue), (2, screen_height - 52))
+            screen.blit(self.debug_text.static_label("(Arrows/Right Drag/Wheel) Move View", blue),
+                        (2, screen_height - 70))
 
         # Display the agent camera (POV) in the bottom right corner of the screen
         if self.show_agent_camera:
-            draw_coords = (self.size[0] - self.agent_camera_dimensions[0],
-                           self.size[1] - self.agent_camera_dimensions[1])
-            self.agent_camera_surface.display()  # Update camera display
+            if self.agent_camera_surface is None:
+                from src.gui_objects.agent_camera import AgentCameraSurface
+                self.agent_camera_surface = AgentCameraSurface(self.agent_camera_dimensions, self.selected_agent)
+
+            draw_coords = (screen_width - self.agent_camera_dimensions[0],
+                           screen_height - self.agent_camera_dimensions[1])
+            self.agent_camera_surface.display(self.agents)  # Update camera display
             screen.blit(self.agent_camera_surface, draw_coords)
 
         self.timer_draw_frame = time.time() - timer_start
+        if self.frame_governor is not None:
+            self.frame_governor.record_phase("draw", self.timer_draw_frame)
 
     def add_obstacle(self, position: (int, int), width: int, height: int):
         """
-        Add an obstacle to the simulation and its sprite group.
+        Add an obstacle to the simulation. Can be called at any time, the edge and obstacle indices are updated
+        incrementally and only sensors close to the new obstacle are recalculated.
         :param position: (x, y) coordinates for top left position of the obstacle.
         :param width: Width of the obstacle.
         :param height: Height of the obstacle.
+        :return: The new obstacle.
         """
         new_obstacle = Obstacle(position, width, height)
-        self.obstacles.add(new_obstacle)
+        new_obstacle.obstacle_id = self.world.add_obstacle(new_obstacle.rect)
+        self.obstacles.append(new_obstacle)
+        self.obstacles_by_id[new_obstacle.obstacle_id] = new_obstacle
+
+        self.invalidate_sensors(new_obstacle.rect)
+        return new_obstacle
+
+    def remove_obstacle(self, obstacle: Obstacle):
+        """
+        Remove an obstacle from the simulation.
+        :param obstacle: Obstacle of this simulation.
+        """
+        self.world.remove_obstacle(obstacle.obstacle_id)
+        self.obstacles.remove(obstacle)
+        del self.obstacles_by_id[obstacle.obstacle_id]
+
+        self.invalidate_sensors(obstacle.rect)
+
+    def move_obstacle(self, obstacle: Obstacle, position: (int, int), width: int = None, height: int = None):
+        """
+        Move and optionally resize an obstacle, e.g. for doors or moving barriers.
+        :param obstacle: Obstacle of this simulation.
+        :param position: New (x, y) coordinates for top left position of the obstacle.
+        :param width: New width of the obstacle. Keeps the current width if None.
+        :param height: New height of the obstacle. Keeps the current height if None.
+        """
+        old_rect = obstacle.rect
+        obstacle.rect = ObstacleRect(position[0], position[1],
+                                     old_rect.width if width is None else width,
+                                     old_rect.height if height is None else height)
+        self.world.move_obstacle(obstacle.obstacle_id, obstacle.rect)
+
+        # Sensors near the old and the new position can be affected
+        self.invalidate_sensors(old_rect)
+        self.invalidate_sensors(obstacle.rect)
+
+    def invalidate_sensors(self, rect):
+        """
+        Invalidate the sensor results of all agents whose sensor rays can reach into the given area.
+        :param rect: Changed area of the simulation.
+        """
+        agent_grid = self._get_agent_grid()
+        ray_lengths = self.agent_ray_lengths
+        max_reach = float(ray_lengths.max()) if len(ray_lengths) else 0
+
+        # Candidates within the longest ray length, then the exact check with the ray length of each agent
+        candidates = agent_grid.query_rect(rect.x - max_reach, rect.y - max_reach,
+                                           rect.x + rect.width + max_reach, rect.y + rect.height + max_reach)
+        reach = ray_lengths[candidates]
+        xs = agent_grid.xs[candidates]
+        ys = agent_grid.ys[candidates]
+        affected = candidates[(xs >= rect.x - reach) & (xs <= rect.x + rect.width + reach) &
+                              (ys >= rect.y - reach) & (ys <= rect.y + rect.height + reach)]
+
+        agents = self.agents
+        for agent_index in affected.tolist():
+            agents[agent_index].vision_sensor.invalidate()
 
     @staticmethod
     def calculate_collision_point(line, obstacle, multiple_collision_points=False):
@@ -343,33 +719,80 @@ class Simulation:
         self.add_obstacle(position=(self.size[0]-thickness, 0), width=thickness, height=self.size[1])
         self.add_obstacle(position=(0, self.size[1]-thickness), width=self.size[0], height=thickness)
 
-    def get_obstacle_edges(self):
+    def memory_report(self):
         """
-        Calculate and store all edges that the objects in the simulation have. This is intended to be run once at the
-        beginning of the simulation. By storing all edges as coordinates, collision detection is sped up.
-        :return: List of obstacle edge coordinates.
+        Estimate the memory used by the agents of the simulation including their sensors. Data shared between agents
+        (e.g. relative sensor positions of equal sensor configurations) is only counted once.
+        :return: Dictionary with the number of agents, the total bytes and the average bytes per agent.
         """
-        obstacle_edges = []
+        seen = set()
+        agent_bytes = 0
+        sensor_bytes = 0
 
-        for obstacle in self.obstacles:
-            # Obstacle edge points
-            top_left = (obstacle.rect.x, obstacle.rect.y)
-            top_right = (obstacle.rect.x + obstacle.rect.width, obstacle.rect.y)
-            bottom_left = (obstacle.rect.x, obstacle.rect.y + obstacle.rect.height)
-            bottom_right = (obstacle.rect.x + obstacle.rect.width, obstacle.rect.y + obstacle.rect.height)
+        for agent in self.agents:
+            sensor_bytes += utils.get_deep_size(agent.vision_sensor, seen, exclude=(agent, self))
+            agent_bytes += utils.get_deep_size(agent, seen, exclude=(self,))
 
-            # Obstacle edge lines
-            edge_top = (top_left, top_right)
-            edge_right = (top_right, bottom_right)
-            edge_bottom = (bottom_left, bottom_right)
-            edge_left = (top_left, bottom_left)
+        total_bytes = agent_bytes + sensor_bytes
+        return {"num_agents": len(self.agents),
+                "agent_bytes": agent_bytes,
+                "sensor_bytes": sensor_bytes,
+                "total_bytes": total_bytes,
+                "bytes_per_agent": total_bytes / len(self.agents) if self.agents else 0}
 
-            obstacle_edges += [edge_top, edge_right, edge_bottom, edge_left]
+    def _get_agent_positions(self):
+        """
+        :return: numpy arrays with the x and y coordinates of all agents.
+        """
+        import numpy as np
 
-        return obstacle_edges
+        xs = np.fromiter((agent.x for agent in self.agents), dtype=np.float64, count=len(self.agents))
+        ys = np.fromiter((agent.y for agent in self.agents), dtype=np.float64, count=len(self.agents))
+        return xs, ys
+
+    def _get_agent_grid(self):
+        """
+        Get the grid over the agent positions of the current step. It is built on first use after every step and
+        shared by all queries of that step.
+        :return: PointGrid, the point indices are indices into the agent list.
+        """
+        if self.agent_grid is None or len(self.agent_grid.xs) != len(self.agents):
+            import numpy as np
+            from src.point_grid import PointGrid
+
+            xs, ys = self._get_agent_positions()
+            self.agent_grid = PointGrid(xs, ys, cell_size=64)
+
+            # Sensor configurations do not change, so the ray lengths are only collected again for new agents
+            if self.agent_ray_lengths is None or len(self.agent_ray_lengths) != len(self.agents):
+                self.agent_ray_lengths = np.fromiter((agent.vision_sensor.ray_length for agent in self.agents),
+                                                     dtype=np.float64, count=len(self.agents))
+
+        return self.agent_grid
+
+    def _get_agents_in_view(self, margin: float = 0):
+        """
+        Get the agents within the visible area of the viewport, using the grid over the agent positions of the current
+        step. The agent and the sensor pass of a frame share the same grid.
+        :param margin: Extra world units around the visible area.
+        :return: List of agents.
+        """
+        if self.viewport.shows_whole_world():
+            return self.agents
+
+        agents = self.agents
+        agent_grid = self._get_agent_grid()
+        return [agents[index] for index in agent_grid.query_rect(*self.viewport.visible_rect(margin)).tolist()]
 
     def _on_mouseclick(self, click_margin: int = 10):
+        import pygame
+        from src.gui_objects.agent_camera import AgentCameraSurface
+
+        # Convert the click to world coordinates, the click margin stays the same on the screen
         mouse_position = pygame.mouse.get_pos()
+        if self.viewport is not None:
+            mouse_position = self.viewport.screen_to_world(*mouse_position)
+            click_margin = click_margin / self.viewport.zoom
 
         near_agent = None
         near_agent_distance = None
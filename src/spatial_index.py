@@ -0,0 +1,124 @@
+import math
+
+
+class EdgeGrid:
+    """
+    Uniform grid over the simulation area that maps every cell to the obstacle edges passing through it. Used to only
+    test the edges close to an agent instead of all edges of the simulation.
+    """
+
+    def __init__(self, cell_size: int = 128):
+        """
+        :param cell_size: Width and height of one grid cell.
+        """
+        self.cell_size = cell_size
+        self.cells = {}  # (cell_x, cell_y) -> list of edge ids
+        self.edges = {}  # edge id -> ((x1, y1), (x2, y2))
+        self.next_edge_id = 0
+
+    def _edge_cells(self, edge):
+        # Obstacle edges are axis aligned, so the bounding box of the edge covers exactly the cells it passes through
+        (x1, y1), (x2, y2) = edge
+        cell_size = self.cell_size
+        for cell_x in range(math.floor(min(x1, x2) / cell_size), math.floor(max(x1, x2) / cell_size) + 1):
+            for cell_y in range(math.floor(min(y1, y2) / cell_size), math.floor(max(y1, y2) / cell_size) + 1):
+                yield cell_x, cell_y
+
+    def insert(self, edge) -> int:
+        """
+        Add an edge to the grid.
+        :param edge: Edge defined by its start and end coordinates.
+        :return: Id of the edge, used to remove it again.
+        """
+        edge_id = self.next_edge_id
+        self.next_edge_id += 1
+        self.edges[edge_id] = edge
+        for cell in self._edge_cells(edge):
+            self.cells.setdefault(cell, []).append(edge_id)
+        return edge_id
+
+    def query(self, x: float, y: float, radius: float):
+        """
+        Get all edges that pass through a grid cell touched by the square around a point. This is a superset of the
+        edges within the radius of the point.
+        :return: List of edges.
+        """
+        cell_size = self.cell_size
+        cells = self.cells
+        edge_ids = set()
+        for cell_x in range(math.floor((x - radius) / cell_size), math.floor((x + radius) / cell_size) + 1):
+            for cell_y in range(math.floor((y - radius) / cell_size), math.floor((y + radius) / cell_size) + 1):
+                cell_edges = cells.get((cell_x, cell_y))
+                if cell_edges:
+                    edge_ids.update(cell_edges)
+        edges = self.edges
+        return [edges[edge_id] for edge_id in edge_ids]
+
+    def remove(self, edge_id: int):
+        """
+        Remove an edge from the grid. Only the cells the edge passes through are touched.
+        :param edge_id: Id returned by insert.
+        """
+        edge = self.edges.pop(edge_id)
+        for cell in self._edge_cells(edge):
+            cell_edges = self.cells[cell]
+            cell_edges.remove(edge_id)
+            if not cell_edges:
+                del self.cells[cell]
+
+
+class RectGrid:
+    """
+    Uniform grid that maps every cell to the ids of the rects overlapping it. Used for point and area queries on the
+    obstacles of the simulation.
+    """
+
+    def __init__(self, cell_size: int = 128):
+        """
+        :param cell_size: Width and height of one grid cell.
+        """
+        self.cell_size = cell_size
+        self.cells = {}  # (cell_x, cell_y) -> list of rect ids
+        self.rects = {}  # rect id -> rect
+
+    def _rect_cells(self, x0, y0, x1, y1):
+        cell_size = self.cell_size
+        for cell_x in range(math.floor(x0 / cell_size), math.floor(x1 / cell_size) + 1):
+            for cell_y in range(math.floor(y0 / cell_size), math.floor(y1 / cell_size) + 1):
+                yield cell_x, cell_y
+
+    def insert(self, rect_id, rect):
+        """
+        :param rect_id: Id the rect is stored under.
+        :param rect: Rect with x, y, width and height attributes.
+        """
+        self.rects[rect_id] = rect
+        for cell in self._rect_cells(rect.x, rect.y, rect.x + rect.width, rect.y + rect.height):
+            self.cells.setdefault(cell, []).append(rect_id)
+
+    def remove(self, rect_id):
+        rect = self.rects.pop(rect_id)
+        for cell in self._rect_cells(rect.x, rect.y, rect.x + rect.width, rect.y + rect.height):
+            cell_rects = self.cells[cell]
+            cell_rects.remove(rect_id)
+            if not cell_rects:
+                del self.cells[cell]
+
+    def query_point(self, x: float, y: float):
+        """
+        :return: Ids of all rects in the grid cell of the point. The rects still need to be checked for the point.
+        """
+        cell_size = self.cell_size
+        return self.cells.get((math.floor(x / cell_size), math.floor(y / cell_size)), ())
+
+    def query_rect(self, x0: float, y0: float, x1: float, y1: float):
+        """
+        :return: Set of ids of all rects in the grid cells overlapped by the area (x0, y0) - (x1, y1).
+        """
+        rect_ids = set()
+        cells = self.cells
+        for cell in self._rect_cells(x0, y0, x1, y1):
+            cell_rects = cells.get(cell)
+            if cell_rects:
+                rect_ids.update(cell_rects)
+        return rect_ids
@@ -0,0 +1,140 @@
+import random
+from typing import List, Tuple
+
+
+class SpawnSampler:
+    """
+    Samples agent spawn locations from the free space of the simulation area. The free space is decomposed once into
+    non-overlapping rectangles, which are then chosen weighted by their area. Every sampled point is guaranteed to lie
+    outside of all obstacles, so no rejection sampling against the obstacles is needed.
+    """
+
+    def __init__(self, size: Tuple[int, int], obstacle_rects):
+        """
+        :param size: Dimensions of the simulation area defined as a tuple (x, y).
+        :param obstacle_rects: Rects of all obstacles (anything with x, y, width and height attributes).
+        """
+        self.size = size
+        self.free_rects = self.calculate_free_rects(size, obstacle_rects)
+
+        # Cumulative free area, used for area weighted rect selection
+        self.cumulative_areas = []
+        total_area = 0
+        for _, _, width, height in self.free_rects:
+            total_area += width * height
+            self.cumulative_areas.append(total_area)
+        self.free_area = total_area
+
+    @staticmethod
+    def calculate_free_rects(size: Tuple[int, int], obstacle_rects) -> List[Tuple[int, int, int, int]]:
+        """
+        Decompose the free space into rectangles by sweeping over vertical slabs between obstacle x-borders. Within a
+        slab every obstacle either covers the full slab width or not at all, so the free space of a slab is a set of
+        y-intervals. Neighbouring slabs with the same free intervals are merged.
+        :param size: Dimensions of the simulation area.
+        :param obstacle_rects: Rects of all obstacles.
+        :return: List of free rects as (x, y, width, height) on the integer grid of the simulation.
+        """
+        # Clamp obstacles to the simulation area and drop the ones without area
+        obstacles = []
+        for rect in obstacle_rects:
+            x0, x1 = max(0, rect.x), min(size[0], rect.x + rect.width)
+            y0, y1 = max(0, rect.y), min(size[1], rect.y + rect.height)
+            if x0 < x1 and y0 < y1:
+                obstacles.append((x0, x1, y0, y1))
+
+        slab_borders = sorted({0, size[0]} | {x0 for x0, _, _, _ in obstacles} | {x1 for _, x1, _, _ in obstacles})
+        obstacles_by_start = sorted(obstacles)
+        next_obstacle = 0
+        active_obstacles = []
+
+        free_rects = []
+        open_intervals = {}  # (y0, y1) -> x start of a rect that is still being extended
+
+        for slab_start in slab_borders[:-1]:
+            # Update obstacles that cover this slab
+            while next_obstacle < len(obstacles_by_start) and obstacles_by_start[next_obstacle][0] <= slab_start:
+                active_obstacles.append(obstacles_by_start[next_obstacle])
+                next_obstacle += 1
+            active_obstacles = [obstacle for obstacle in active_obstacles if obstacle[1] > slab_start]
+
+            # Free y-intervals are the gaps between the merged obstacle intervals
+            free_intervals = []
+            free_start = 0
+            for _, _, y0, y1 in sorted(active_obstacles, key=lambda obstacle: obstacle[2]):
+                if y0 > free_start:
+                    free_intervals.append((free_start, y0))
+                free_start = max(free_start, y1)
+            if free_start < size[1]:
+                free_intervals.append((free_start, size[1]))
+
+            # Close rects whose interval does not continue into this slab and open new ones
+            continued_intervals = set(free_intervals)
+            for interval in list(open_intervals):
+                if interval not in continued_intervals:
+                    rect_start = open_intervals.pop(interval)
+                    free_rects.append((rect_start, interval[0], slab_start - rect_start, interval[1] - interval[0]))
+            for interval in free_intervals:
+                open_intervals.setdefault(interval, slab_start)
+
+        for interval, rect_start in open_intervals.items():
+            free_rects.append((rect_start, interval[0], size[0] - rect_start, interval[1] - interval[0]))
+
+        return free_rects
+
+    def sample(self, number_of_points: int, min_separation: float = 0, max_attempts: int = 30):
+        """
+        Sample spawn locations in one batch.
+        :param number_of_points: Number of locations to sample.
+        :param min_separation: Minimum distance between any two of the sampled locations. 0 disables the check.
+        :param max_attempts: Average number of candidates drawn per location before giving up. Only relevant when a
+                             minimum separation is set.
+        :return: List of (x, y) integer coordinates.
+        """
+        if number_of_points <= 0:
+            return []
+        if self.free_area == 0:
+            raise ValueError("No free space left to spawn agents in")
+
+        if min_separation <= 0:
+            return self._sample_candidates(number_of_points)
+
+        # Accepted points are stored in a uniform grid with cell size = min separation, so only the 3x3 neighbouring
+        # cells need to be checked for every candidate
+        grid = {}
+        min_separation_sq = min_separation ** 2
+        locations = []
+        remaining_candidates = number_of_points * max_attempts
+
+        while len(locations) < number_of_points and remaining_candidates > 0:
+            batch_size = min(remaining_candidates, 2 * (number_of_points - len(locations)))
+            remaining_candidates -= batch_size
+
+            for x, y in self._sample_candidates(batch_size):
+                cell_x = int(x // min_separation)
+                cell_y = int(y // min_separation)
+
+                too_close = any((other_x - x) ** 2 + (other_y - y) ** 2 < min_separation_sq
+                                for neighbour_x in range(cell_x - 1, cell_x + 2)
+                                for neighbour_y in range(cell_y - 1, cell_y + 2)
+                                for other_x, other_y in grid.get((neighbour_x, neighbour_y), ()))
+
+                if not too_close:
+                    grid.setdefault((cell_x, cell_y), []).append((x, y))
+                    locations.append((x, y))
+                    if len(locations) == number_of_points:
+                        break
+
+        if len(locations) < number_of_points:
+            raise ValueError(f"Could only place {len(locations)} of {number_of_points} agents with a minimum "
+                             f"separation of {min_separation}")
+
+        return locations
+
+    def _sample_candidates(self, number_of_points: int):
+        """
+        Draw uniformly distributed free locations without any separation constraint.
+        """
+        rects = random.choices(self.free_rects, cum_weights=self.cumulative_areas, k=number_of_points)
+        return [(random.randrange(x, x + width), random.randrange(y, y + height)) for x, y, width, height in rects]
+
@@ -0,0 +1,328 @@
+"""
+Live streaming of the simulation state to any number of observers over a TCP or Unix socket.
+
+Every published step is sent as one binary message (little endian):
+
+    header      uint32 length of the rest of the message, uint8 message type, uint32 tick
+    timings     4 x float32: agent updates, collision handling, sensor updates, draw time in seconds
+    selection   int32 id of the selected agent (-1 if none), uint16 number of rays n, float32 ray length,
+                float32 field of view, n x float32 sensor collision distances (NaN = no collision)
+    agents      KEYFRAME: uint32 number of agents m, float32 position resolution, m x int32 agent ids,
+                          m x int32 x, m x int32 y, m x uint8 rotation
+                DELTA:    uint32 number of agents m, m x int8 x change, m x int8 y change, m x int8 rotation change
+
+Positions are quantized to multiples of the position resolution, rotations to 1/256 of a full turn. Deltas are
+computed between quantized states, so they add up without drift. A keyframe is sent to new clients, periodically, and
+whenever the agents changed or moved too far for a delta.
+"""
+import os
+import socket
+import struct
+from collections import deque
+
+import numpy as np
+
+KEYFRAME = 1
+DELTA = 2
+
+HEADER = struct.Struct("<IBI")
+TIMINGS = struct.Struct("<4f")
+SELECTION = struct.Struct("<iHff")
+AGENT_COUNT = struct.Struct("<I")
+RESOLUTION = struct.Struct("<f")
+
+
+class _Client:
+    """
+    Connection of one observer with its queue of unsent messages.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.messages = deque()
+        self.offset = 0  # Bytes of the first message that were already sent
+        self.pending_bytes = 0
+        self.needs_keyframe = True
+
+    def queue(self, message: bytes):
+        self.messages.append(message)
+        self.pending_bytes += len(message)
+
+    def drop_unsent(self):
+        """
+        Drop all queued messages that were not started yet. A partially sent message is kept, so the stream stays
+        readable.
+        """
+        if self.offset > 0:
+            first_message = self.messages[0]
+            self.messages.clear()
+            self.messages.append(first_message)
+            self.pending_bytes = len(first_message) - self.offset
+        else:
+            self.messages.clear()
+            self.pending_bytes = 0
+
+    def flush(self):
+        """
+        Send as much of the queued messages as the socket accepts without blocking.
+        :raise OSError: If the connection is broken.
+        """
+        while self.messages:
+            message = self.messages[0]
+            try:
+                sent = self.connection.send(memoryview(message)[self.offset:])
+            except BlockingIOError:
+                return
+
+            self.offset += sent
+            self.pending_bytes -= sent
+            if self.offset < len(message):
+                return
+            self.messages.popleft()
+            self.offset = 0
+
+
+class StatePublisher:
+    """
+    Serves the state of a simulation to observers. publish() is called once per simulation step and never blocks:
+    messages are queued per client and sent as far as the socket allows. If a slow client falls behind by more than
+    max_pending_bytes, its unsent messages are dropped and it continues directly with a keyframe of the current state,
+    so it never works through an outdated backlog.
+    """
+
+    def __init__(self, address, keyframe_interval: int = 300, position_resolution: float = 1.0,
+                 max_pending_bytes: int = None):
+        """
+        :param address: (host, port) tuple for a TCP socket or a file path for a Unix socket.
+        :param keyframe_interval: Send a keyframe to all clients every n-th published step.
+        :param position_resolution: Quantization step of the agent positions in world units.
+        :param max_pending_bytes: Maximum size of the unsent messages of one client. By default three keyframes, but at
+                                  least 1 MB, so a client that is only briefly slow still receives deltas.
+        """
+        self.address = address
+        self.keyframe_interval = keyframe_interval
+        self.position_resolution = position_resolution
+        self.max_pending_bytes = max_pending_bytes
+
+        if isinstance(address, str):
+            # Remove the socket file of an earlier run
+            if os.path.exists(address):
+                os.unlink(address)
+            self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(address)
+        self.server.listen()
+        self.server.setblocking(False)
+
+        self.clients = []
+        self.tick = 0
+
+        # Quantized state of the last published step, deltas are relative to it
+        self.last_agent_ids = None
+        self.last_xs = None
+        self.last_ys = None
+        self.last_rotations = None
+
+    def publish(self, simulation):
+        """
+        Send the current state of the simulation to all connected clients.
+        :param simulation: Simulation instance.
+        """
+        self._accept_clients()
+        tick = self.tick
+        self.tick += 1
+
+        if not self.clients:
+            self.last_agent_ids = None
+            return
+
+        agents = simulation.agents
+        agent_ids = np.fromiter((agent.agent_id for agent in agents), dtype=np.int32, count=len(agents))
+        xs, ys = simulation._get_agent_positions()
+        xs = np.round(xs / self.position_resolution).astype(np.int32)
+        ys = np.round(ys / self.position_resolution).astype(np.int32)
+        rotations = np.fromiter((agent.rotation for agent in agents), dtype=np.float64, count=len(agents))
+        rotations = (np.round(rotations * 256 / 360).astype(np.int64) % 256).astype(np.uint8)
+
+        common = self._encode_timings(simulation) + self._encode_selection(simulation.selected_agent)
+
+        # Deltas need the same agents as the last step and changes that fit into int8
+        delta_message = None
+        if (self.last_agent_ids is not None and tick % self.keyframe_interval != 0 and
+                np.array_equal(agent_ids, self.last_agent_ids)):
+            delta_xs = xs - self.last_xs
+            delta_ys = ys - self.last_ys
+            if len(agents) == 0 or max(np.abs(delta_xs).max(), np.abs(delta_ys).max()) <= 127:
+                delta_rotations = rotations.astype(np.int16) - self.last_rotations
+                delta_rotations = (delta_rotations + 128) % 256 - 128
+                delta_message = self._encode_message(DELTA, tick, common + AGENT_COUNT.pack(len(agents)) +
+                                                     delta_xs.astype(np.int8).tobytes() +
+                                                     delta_ys.astype(np.int8).tobytes() +
+                                                     delta_rotations.astype(np.int8).tobytes())
+
+        max_pending_bytes = self.max_pending_bytes
+        if max_pending_bytes is None:
+            keyframe_size = (HEADER.size + len(common) + AGENT_COUNT.size + RESOLUTION.size +
+                             len(agents) * (3 * 4 + 1))
+            max_pending_bytes = max(1 << 20, 3 * keyframe_size)
+
+        keyframe_message = None
+        for client in list(self.clients):
+            # Slow client: drop its backlog and resync with a keyframe of the current state
+            if client.pending_bytes > max_pending_bytes:
+                client.drop_unsent()
+                client.needs_keyframe = True
+
+            if delta_message is not None and not client.needs_keyframe:
+                client.queue(delta_message)
+            else:
+                if keyframe_message is None:
+                    keyframe_message = self._encode_message(KEYFRAME, tick, common + AGENT_COUNT.pack(len(agents)) +
+                                                            RESOLUTION.pack(self.position_resolution) +
+                                                            agent_ids.tobytes() + xs.tobytes() + ys.tobytes() +
+                                                            rotations.tobytes())
+                client.queue(keyframe_message)
+                client.needs_keyframe = False
+
+            try:
+                client.flush()
+            except OSError:
+                self._disconnect(client)
+
+        self.last_agent_ids = agent_ids
+        self.last_xs = xs
+        self.last_ys = ys
+        self.last_rotations = rotations
+
+    def close(self):
+        """
+        Disconnect all clients and stop listening.
+        """
+        for client in list(self.clients):
+            self._disconnect(client)
+        self.server.close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def _accept_clients(self):
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except BlockingIOError:
+                return
+
+            connection.setblocking(False)
+            if connection.family != socket.AF_UNIX:
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.clients.append(_Client(connection))
+
+    def _disconnect(self, client: _Client):
+        self.clients.remove(client)
+        client.connection.close()
+
+    @staticmethod
+    def _encode_message(message_type: int, tick: int, body: bytes) -> bytes:
+        return HEADER.pack(len(body) + HEADER.size - 4, message_type, tick) + body
+
+    @staticmethod
+    def _encode_timings(simulation) -> bytes:
+        return TIMINGS.pack(simulation.timer_agent_updates, simulation.timer_collision_handling,
+                            simulation.timer_sensor_updates, simulation.timer_draw_frame)
+
+    @staticmethod
+    def _encode_selection(agent) -> bytes:
+        if agent is None:
+            return SELECTION.pack(-1, 0, 0, 0)
+
+        sensor = agent.vision_sensor
+        return (SELECTION.pack(agent.agent_id, sensor.num_of_rays, sensor.ray_length, sensor.fov) +
+                np.frombuffer(sensor.collision_distance, dtype=np.float64).astype(np.float32).tobytes())
+
+
+class StateSubscriber:
+    """
+    Observer side of the stream. Connects to a StatePublisher and rebuilds the simulation state from the messages.
+    """
+
+    def __init__(self, address, timeout: float = None):
+        """
+        :param address: (host, port) tuple for a TCP socket or a file path for a Unix socket.
+        :param timeout: Timeout of receive() in seconds. None waits forever.
+        """
+        if isinstance(address, str):
+            self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.connection.settimeout(timeout)
+            self.connection.connect(address)
+        else:
+            self.connection = socket.create_connection(address, timeout=timeout)
+
+        self.position_resolution = 1.0
+        self.agent_ids = None
+        self.xs = None
+        self.ys = None
+        self.rotations = None
+
+    def receive(self) -> dict:
+        """
+        Wait for the next message and apply it to the state.
+        :return: Dictionary with the tick, message type, timings, selected agent sensor data and the agent ids,
+                 positions and rotations (degrees) of the current state.
+        """
+        length = AGENT_COUNT.unpack(self._receive_bytes(4))[0]
+        message = self._receive_bytes(length)
+        message_type, tick = struct.unpack_from("<BI", message)
+        position = 5
+
+        timings = TIMINGS.unpack_from(message, position)
+        position += TIMINGS.size
+
+        selected_agent_id, num_rays, ray_length, fov = SELECTION.unpack_from(message, position)
+        position += SELECTION.size
+        sensor_distances = np.frombuffer(message, dtype=np.float32, count=num_rays, offset=position)
+        position += 4 * num_rays
+
+        num_agents = AGENT_COUNT.unpack_from(message, position)[0]
+        position += AGENT_COUNT.size
+
+        if message_type == KEYFRAME:
+            self.position_resolution = RESOLUTION.unpack_from(message, position)[0]
+            position += RESOLUTION.size
+            self.agent_ids = np.frombuffer(message, dtype=np.int32, count=num_agents, offset=position)
+            position += 4 * num_agents
+            self.xs = np.frombuffer(message, dtype=np.int32, count=num_agents, offset=position).copy()
+            position += 4 * num_agents
+            self.ys = np.frombuffer(message, dtype=np.int32, count=num_agents, offset=position).copy()
+            position += 4 * num_agents
+            self.rotations = np.frombuffer(message, dtype=np.uint8, count=num_agents, offset=position).copy()
+        elif message_type == DELTA:
+            deltas = np.frombuffer(message, dtype=np.int8, count=3 * num_agents, offset=position).reshape(3, -1)
+            self.xs += deltas[0]
+            self.ys += deltas[1]
+            self.rotations += deltas[2].view(np.uint8)
+        else:
+            raise ValueError(f"Unknown message type {message_type}")
+
+        return {"tick": tick,
+                "message_type": message_type,
+                "timings": dict(zip(("agent_updates", "collision_handling", "sensor_updates", "draw_frame"),
+                                    timings)),
+                "selected_agent": {"agent_id": selected_agent_id, "ray_length": ray_length, "fov": fov,
+                                   "collision_distances": sensor_distances} if selected_agent_id >= 0 else None,
+                "agent_ids": self.agent_ids,
+                "xs": self.xs * self.position_resolution,
+                "ys": self.ys * self.position_resolution,
+                "rotations": self.rotations * (360 / 256)}
+
+    def close(self):
+        self.connection.close()
+
+    def _receive_bytes(self, length: int) -> bytes:
+        data = bytearray()
+        while len(data) < length:
+            chunk = self.connection.recv(length - len(data))
+            if not chunk:
+                raise ConnectionError("State stream closed")
+            data += chunk
+        return bytes(data)
@@ -1,4 +1,6 @@
 import math
+import sys
+from array import array
 
 
 def calculate_distance(point1, point2):
@@ -88,6 +90,42 @@ def line_intersection(line1, line2):
     return None  # Lines do not intersect
 
 
+def point_segment_distance(px, py, ax, ay, bx, by):
+    """
+    Scalar version of minimum_distance that works on plain coordinates and does not allocate tuples.
+    """
+    dx = bx - ax
+    dy = by - ay
+    l2 = dx * dx + dy * dy
+    if l2 == 0:
+        return math.hypot(px - ax, py - ay)
+    t = max(0, min(1, ((px - ax) * dx + (py - ay) * dy) / l2))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def ray_segment_intersection(ox, oy, rx, ry, ax, ay, bx, by):
+    """
+    Intersection of the ray segment (ox, oy) -> (ox + rx, oy + ry) with the segment (ax, ay) -> (bx, by).
+    :return: Fraction of the ray length at which the intersection lies or -1 if the segments do not intersect.
+    """
+    sx = bx - ax
+    sy = by - ay
+    rxs = rx * sy - ry * sx
+
+    # Parallel or collinear segments are treated as not intersecting, same as in line_intersection
+    if rxs == 0:
+        return -1
+
+    qx = ax - ox
+    qy = ay - oy
+    t = (qx * sy - qy * sx) / rxs
+    u = (qx * ry - qy * rx) / rxs
+
+    if 0 <= t <= 1 and 0 <= u <= 1:
+        return t
+    return -1
+
+
 def rotate_polygon(polygon, angle):
     # Convert angle to radians
     angle_rad = math.radians(angle)
@@ -111,6 +149,48 @@ def elem_wise_add(list_1, list_2):
     return [x + y for x, y in zip(list_1, list_2)]
 
 
+def get_deep_size(obj, seen=None, exclude=()):
+    """
+    Estimate the memory footprint of an object including everything it references. Objects that were already counted
+    (tracked by id in seen) are skipped, which allows measuring shared data only once across multiple calls.
+    :param obj: Object to measure.
+    :param seen: Set of already counted object ids. Pass the same set to multiple calls to share it.
+    :param exclude: Objects that are not followed, e.g. back-references to the simulation.
+    :return: Size in bytes.
+    """
+    if seen is None:
+        seen = set()
+    excluded_ids = {id(excluded) for excluded in exclude}
+
+    size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or id(current) in excluded_ids or isinstance(current, type):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+
+        # Arrays, strings and numbers do not reference other python objects
+        if isinstance(current, (array, str, bytes, int, float)):
+            continue
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+
+        if hasattr(current, "__dict__"):
+            stack.append(current.__dict__)
+        for cls in type(current).__mro__:
+            for slot in getattr(cls, "__slots__", ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+
+    return size
+
+
 if __name__ == '__main__':
     a = line_intersection(((540, 263), (540.9685984979026, -36.721640554948635)), ((300, 200), (700, 200)))
     print(a)
\ No newline at end of file
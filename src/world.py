@@ -0,0 +1,180 @@
+import hashlib
+import os
+import pickle
+import random
+from typing import Tuple
+
+from src.sim_objects.obstacle import ObstacleRect
+from src.spatial_index import EdgeGrid, RectGrid
+from src.spawn_sampler import SpawnSampler
+
+# Increase when the pickled layout of World changes, so old cache files are not loaded anymore
+WORLD_CACHE_VERSION = 2
+
+
+class World:
+    """
+    Geometry of a simulation: obstacle rects, obstacle edges, the spatial indices and the spawn table. Everything in
+    here only depends on the obstacle layout, so a world can be built once and reused by many simulations. Obstacles
+    can be added, removed and moved at runtime, which updates the indices incrementally.
+    """
+
+    def __init__(self, size: Tuple[int, int], obstacle_rects, index_cell_size: int = 128):
+        """
+        :param size: Dimensions of the simulation area defined as a tuple (x, y).
+        :param obstacle_rects: List of ObstacleRect.
+        :param index_cell_size: Cell size of the spatial edge and obstacle indices.
+        """
+        self.size = tuple(size)
+
+        self.obstacle_rects = {}  # obstacle id -> rect
+        self.obstacle_edge_ids = {}  # obstacle id -> ids of its edges in the edge index
+        self.edge_index = EdgeGrid(cell_size=index_cell_size)
+        self.obstacle_index = RectGrid(cell_size=index_cell_size)
+        self.next_obstacle_id = 0
+
+        for rect in obstacle_rects:
+            self.add_obstacle(ObstacleRect(*rect))
+
+        # Build the spawn table right away, so it is part of the cached world
+        self._spawn_sampler = SpawnSampler(self.size, self.obstacle_rects.values())
+
+    @property
+    def obstacle_edges(self):
+        """
+        List of all obstacle edges as coordinate pairs.
+        """
+        return list(self.edge_index.edges.values())
+
+    @property
+    def spawn_sampler(self) -> SpawnSampler:
+        """
+        Spawn table of the current free space. Rebuilt on first access after the obstacles changed.
+        """
+        if self._spawn_sampler is None:
+            self._spawn_sampler = SpawnSampler(self.size, self.obstacle_rects.values())
+        return self._spawn_sampler
+
+    def add_obstacle(self, rect: ObstacleRect) -> int:
+        """
+        Add an obstacle to the world and insert its edges into the indices.
+        :param rect: Rect of the new obstacle.
+        :return: Id of the obstacle.
+        """
+        obstacle_id = self.next_obstacle_id
+        self.next_obstacle_id += 1
+
+        self.obstacle_rects[obstacle_id] = rect
+        self.obstacle_edge_ids[obstacle_id] = [self.edge_index.insert(edge) for edge in self.calculate_rect_edges(rect)]
+        self.obstacle_index.insert(obstacle_id, rect)
+        self._spawn_sampler = None
+
+        return obstacle_id
+
+    def remove_obstacle(self, obstacle_id: int) -> ObstacleRect:
+        """
+        Remove an obstacle and its edges from the world.
+        :param obstacle_id: Id of the obstacle.
+        :return: Rect of the removed obstacle.
+        """
+        for edge_id in self.obstacle_edge_ids.pop(obstacle_id):
+            self.edge_index.remove(edge_id)
+        self.obstacle_index.remove(obstacle_id)
+        self._spawn_sampler = None
+
+        return self.obstacle_rects.pop(obstacle_id)
+
+    def move_obstacle(self, obstacle_id: int, rect: ObstacleRect):
+        """
+        Replace the rect of an obstacle, e.g. to move or resize it. The obstacle keeps its id.
+        :param obstacle_id: Id of the obstacle.
+        :param rect: New rect of the obstacle.
+        """
+        for edge_id in self.obstacle_edge_ids[obstacle_id]:
+            self.edge_index.remove(edge_id)
+        self.obstacle_index.remove(obstacle_id)
+
+        self.obstacle_rects[obstacle_id] = rect
+        self.obstacle_edge_ids[obstacle_id] = [self.edge_index.insert(edge) for edge in self.calculate_rect_edges(rect)]
+        self.obstacle_index.insert(obstacle_id, rect)
+        self._spawn_sampler = None
+
+    @staticmethod
+    def calculate_rect_edges(rect):
+        """
+        :param rect: Obstacle rect.
+        :return: Top, right, bottom and left edge of the rect as coordinate pairs.
+        """
+        # Obstacle edge points
+        top_left = (rect.x, rect.y)
+        top_right = (rect.x + rect.width, rect.y)
+        bottom_left = (rect.x, rect.y + rect.height)
+        bottom_right = (rect.x + rect.width, rect.y + rect.height)
+
+        # Obstacle edge lines
+        edge_top = (top_left, top_right)
+        edge_right = (top_right, bottom_right)
+        edge_bottom = (bottom_left, bottom_right)
+        edge_left = (top_left, bottom_left)
+
+        return [edge_top, edge_right, edge_bottom, edge_left]
+
+    @staticmethod
+    def load_or_build(cache_key, build_function, cache_dir: str = None):
+        """
+        Load a world from the disk cache or build and store it if it is not cached yet.
+        :param cache_key: Any repr-able value that uniquely describes the world, e.g. its generation parameters.
+        :param build_function: Function without arguments that builds the world on a cache miss.
+        :param cache_dir: Directory of the cache files. If None, the world is always built and not stored.
+        :return: World instance.
+        """
+        if cache_dir is None:
+            return build_function()
+
+        key_hash = hashlib.sha256(repr((WORLD_CACHE_VERSION, cache_key)).encode()).hexdigest()[:32]
+        cache_path = os.path.join(cache_dir, f"world_{key_hash}.pickle")
+
+        try:
+            with open(cache_path, "rb") as cache_file:
+                return pickle.load(cache_file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+        world = build_function()
+
+        # Write to a temporary file first, so parallel processes never read a partially written cache file
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as cache_file:
+            pickle.dump(world, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+
+        return world
+
+
+def build_random_world(size: Tuple[int, int], seed: int = None, number_of_obstacles: int = 5,
+                       border_thickness: int = 50) -> World:
+    """
+    Build a world with randomly placed obstacles and a border around the simulation area.
+    :param size: Dimensions of the simulation area defined as a tuple (x, y).
+    :param seed: Seed for the obstacle placement. Uses an own random generator, so the global random state is
+                 independent of whether the world was loaded from cache or built.
+    :param number_of_obstacles: Number of random obstacles.
+    :param border_thickness: Width of the border.
+    :return: World instance.
+    """
+    rng = random.Random(seed)
+
+    obstacle_rects = []
+    for _ in range(number_of_obstacles):
+        obstacle_rects.append(ObstacleRect(rng.randint(0, size[0]-300), rng.randint(0, size[1]-300),
+                                           rng.randint(50, 500), rng.randint(50, 500)))
+
+    obstacle_rects += [
+        ObstacleRect(0, 0, border_thickness, size[1]),
+        ObstacleRect(0, 0, size[0], border_thickness),
+        ObstacleRect(size[0] - border_thickness, 0, border_thickness, size[1]),
+        ObstacleRect(0, size[1] - border_thickness, size[0], border_thickness)
+    ]
+
+    return World(size, obstacle_rects)